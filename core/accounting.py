@@ -0,0 +1,95 @@
+import inspect
+import time
+
+
+METHODS = {}
+
+
+def strategyMethods(strategy_cls):
+    # public methods of strategy called by engine and cards: phases of turn
+    # and card callbacks, but not event handlers nor other callable class
+    # attributes (e.g. strategy classes used by search)
+    if strategy_cls not in METHODS:
+        METHODS[strategy_cls] = [name for name in dir(strategy_cls)
+            if not name.startswith('_') and not name.startswith('on') and
+               name != 'setPlayer' and
+               inspect.isfunction(inspect.getattr_static(strategy_cls, name))]
+    return METHODS[strategy_cls]
+
+
+def strategyName(strategy_cls):
+    return "{}.{}".format(strategy_cls.__module__.split('.')[-1],
+        strategy_cls.__name__)
+
+
+class TimedMethod(object):
+    # Method of strategy adding its call and time to <stats>. Unlike a
+    # closure it is pickled with its strategy, e.g. when search sends
+    # games to worker processes.
+    def __init__(self, method, stats, stack):
+        self.method = method
+        self.stats = stats
+        self.stack = stack
+    
+    def __call__(self, *args, **kwargs):
+        stack = self.stack
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.method(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            stats = self.stats
+            stats[0] += 1
+            stats[1] += elapsed - nested
+            if len(stack) > 0:
+                stack[-1] += elapsed
+
+
+class CallAccounting(object):
+    # Listener wrapping public methods of strategies of every new game
+    # (see Game.listen()) to count calls and time spent in them by
+    # (strategy name, method name). Time of nested strategy calls (e.g.
+    # card callback called while card is played in action()) is counted
+    # only for the nested method.
+    def __init__(self):
+        self.calls = {}
+        # time of nested calls for every running call
+        self.stack = []
+    
+    def attach(self, game):
+        game.listen(self)
+        self.onNewGame(game)
+    
+    def onNewGame(self, game):
+        for player in game.players:
+            self.wrap(player.strategy)
+    
+    def wrap(self, strategy):
+        strategy_name = strategyName(strategy.__class__)
+        for method_name in strategyMethods(strategy.__class__):
+            setattr(strategy, method_name, self.timed(strategy_name,
+                method_name, getattr(strategy, method_name)))
+    
+    def timed(self, strategy_name, method_name, method):
+        key = (strategy_name, method_name)
+        if key not in self.calls:
+            self.calls[key] = [0, 0.0]
+        return TimedMethod(method, self.calls[key], self.stack)
+    
+    def takeCalls(self):
+        # returns {(strategy, method): (calls, seconds)} of methods called
+        # since previous call and starts counting from zero
+        calls = dict((key, tuple(stats))
+                     for key, stats in self.calls.items() if stats[0] > 0)
+        for stats in self.calls.values():
+            stats[0], stats[1] = 0, 0.0
+        return calls
+
+
+def addCalls(total, calls):
+    for key, (count, seconds) in calls.items():
+        total_count, total_seconds = total.get(key, (0, 0.0))
+        total[key] = (total_count + count, total_seconds + seconds)
+    return total
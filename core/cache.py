@@ -0,0 +1,152 @@
+import hashlib
+import inspect
+import json
+import sqlite3
+import time
+
+import core.cards
+import core.engine
+import core.rules
+
+
+RULES_VERSION = None
+STRATEGY_VERSIONS = {}
+
+
+def sourceHash(objects):
+    digest = hashlib.sha1()
+    for obj in objects:
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):
+            source = getattr(obj, '__module__', '') + "." + obj.__name__
+        digest.update(source.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def strategyVersion(strategy_cls):
+    # hash of source of strategy class and all its base classes; strategy
+    # picking one of candidate strategies (e.g. RandomStrategy) is hashed
+    # by its own class and versions of all candidates
+    if strategy_cls not in STRATEGY_VERSIONS:
+        if inspect.isclass(strategy_cls):
+            STRATEGY_VERSIONS[strategy_cls] = sourceHash(
+                [cls for cls in inspect.getmro(strategy_cls)
+                 if cls is not object])
+        else:
+            digest = hashlib.sha1(
+                strategyVersion(type(strategy_cls)).encode("utf-8"))
+            for name, cls in getattr(strategy_cls, 'candidates', []):
+                digest.update("{}={}".format(name,
+                    strategyVersion(cls)).encode("utf-8"))
+            STRATEGY_VERSIONS[strategy_cls] = digest.hexdigest()[:16]
+    return STRATEGY_VERSIONS[strategy_cls]
+
+
+def rulesVersion():
+    # hash of source of everything besides strategies affecting results
+    global RULES_VERSION
+    if RULES_VERSION is None:
+        RULES_VERSION = sourceHash([core.cards, core.rules, core.engine])
+    return RULES_VERSION
+
+
+def gameKey(strategies, card_types, seed, game_args):
+    # <strategies> are (name, class) in seat order; games without seed are
+    # never the same and have no key
+    if seed is None:
+        return None
+    key = json.dumps({
+        "strategies": [[name, strategyVersion(strategy_cls)]
+                       for name, strategy_cls in strategies],
+        "rules": rulesVersion(),
+        "kingdom": [str(card_type).lower() for card_type in card_types],
+        "seed": seed,
+        "options": sorted(game_args.items()),
+    }, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    # Results of games (see core.tournament.playGame()) by gameKey() kept
+    # in SQLite database. When total size of results exceeds <max_size>
+    # bytes, least recently used ones are removed.
+    def __init__(self, path, max_size=256 << 20):
+        self.max_size = max_size
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS results_used "
+            "ON results (used)")
+        self.db.commit()
+        self.size = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+    
+    def get(self, keys):
+        found = {}
+        keys = [key for key in keys if key is not None]
+        for start in range(0, len(keys), 500):
+            part = keys[start:start+500]
+            rows = self.db.execute(
+                "SELECT key, value FROM results WHERE key IN ({})".format(
+                    ",".join("?" * len(part))), part).fetchall()
+            for key, value in rows:
+                result = json.loads(value)
+                result["table"] = dict((int(nplayer), tuple(row))
+                    for nplayer, row in result["table"].items())
+                found[key] = result
+        if len(found) > 0:
+            now = time.time()
+            self.db.executemany("UPDATE results SET used = ? WHERE key = ?",
+                [(now, key) for key in found])
+            self.db.commit()
+        return found
+    
+    def put(self, items):
+        # <items> are (key, result) pairs
+        now = time.time()
+        rows = {}
+        for key, result in items:
+            if key is None:
+                continue
+            # log and timings are not results of the game itself
+            value = json.dumps(dict((name, value)
+                for name, value in result.items()
+                if name not in ("log", "cpu", "calls")))
+            rows[key] = (key, value, len(value), now)
+        # replaced results (e.g. put by other process meanwhile) are not
+        # counted twice
+        keys = list(rows)
+        for start in range(0, len(keys), 500):
+            part = keys[start:start+500]
+            self.size -= self.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM results "
+                "WHERE key IN ({})".format(",".join("?" * len(part))),
+                part).fetchone()[0]
+        self.db.executemany("INSERT OR REPLACE INTO results "
+            "VALUES (?, ?, ?, ?)", rows.values())
+        self.size += sum(row[2] for row in rows.values())
+        if self.size > self.max_size:
+            self.evict()
+        self.db.commit()
+    
+    def evict(self):
+        # down to 90% of limit, so eviction does not happen on every put
+        while self.size > self.max_size * 9 // 10:
+            rows = self.db.execute("SELECT key, size FROM results "
+                "ORDER BY used LIMIT 1000").fetchall()
+            if len(rows) == 0:
+                self.size = 0
+                break
+            evicted = []
+            for key, size in rows:
+                if self.size <= self.max_size * 9 // 10:
+                    break
+                evicted.append((key,))
+                self.size -= size
+            self.db.executemany("DELETE FROM results WHERE key = ?", evicted)
+    
+    def close(self):
+        self.db.close()
@@ -1,9 +1,71 @@
 from core.common import RulesViolation
 
 
+# Helpers of Card.targetChoices(); <hand> there is {card type: count} of
+# cards in hand of active player without the card being played.
+
+def byTypeId(card_types):
+    return sorted(card_types, key=lambda card_type: card_type.type_id)
+
+def withoutCard(hand, card_type):
+    rest = dict(hand)
+    rest[card_type] -= 1
+    if rest[card_type] == 0:
+        del rest[card_type]
+    return rest
+
+def withoutCards(hand, card_types):
+    for card_type in card_types:
+        hand = withoutCard(hand, card_type)
+    return hand
+
+def distinct(items):
+    # items without repeats in order of their first occurrence; unlike set
+    # it doesn't depend on hashing of strings, so games with the same seed
+    # are the same in every process
+    return list(dict.fromkeys(items))
+
+def withCard(hand, card_type):
+    rest = dict(hand)
+    rest[card_type] = rest.get(card_type, 0) + 1
+    return rest
+
+def cardSets(hand, max_size=None, size=None):
+    # all different sets of cards of <hand> (of given <size> or not larger
+    # than <max_size>) as lists of card types
+    items = [(card_type, hand[card_type]) for card_type in byTypeId(hand)
+             if hand[card_type] > 0]
+    if size is not None:
+        max_size = size
+    ret = []
+    def collect(i, chosen):
+        if i == len(items):
+            if size is None or len(chosen) == size:
+                ret.append(chosen)
+            return
+        card_type, count = items[i]
+        if max_size is not None:
+            count = min(count, max_size - len(chosen))
+        for n in range(count + 1):
+            collect(i + 1, chosen + [card_type] * n)
+    collect(0, [])
+    return ret
+
+def gainable(game, max_cost=None, mask=None):
+    # card types of non-empty supply piles
+    return byTypeId(card_type
+        for card_type, pile in game.supply.piles.items()
+        if len(pile) > 0 and
+           (max_cost is None or game.currentCost(card_type) <= max_cost) and
+           (mask is None or card_type.type_mask & mask))
+
+
 class Card(object):
     setname = None
     
+    type_id = None
+    type_mask = 0
+    
     cost = 0
     score = 0
     money = 0
@@ -12,6 +74,8 @@ class Card(object):
     draw_cards = 0
     
     def __init__(self):
+        # zone card was put to last; cards are shared by clones of game
+        # (see Game.clone()), so it is the zone of game moving card last
         self.zone = None
     def __str__(self):
         return "{:8s} - (${}){}{}".format(
@@ -21,7 +85,17 @@ class Card(object):
             ("" if self.score == 0 else " ({:+d}VP) ".format(self.score)),)
     @classmethod
     def hasType(cls, *cls_types):
-        return any([issubclass(cls, cls_type) for cls_type in cls_types])
+        for cls_type in cls_types:
+            bit = TYPE_BITS.get(cls_type)
+            if bit is None:
+                if issubclass(cls, cls_type):
+                    return True
+            elif cls.type_mask & bit:
+                return True
+        return False
+    @classmethod
+    def hasMask(cls, mask):
+        return (cls.type_mask & mask) != 0
     @classmethod
     def name(cls):
         return cls.__name__.lower()
@@ -40,8 +114,30 @@ class Card(object):
         else:
             raise RulesViolation("Can only play Action cards during "
                 "action phase and Buy cards during buy phase")
+    # lists of targets accepted by play() given <hand> of active player
+    # (see helpers above), for cards without targets the only choice is
+    # no targets
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[]]
+    # (cards surely left of <hand> after play with <targets>, card types
+    # gained from supply by it) for second play by throne room, None if
+    # card can't be played twice; cards drawn by play are unknown
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return hand, []
+    # card types other players may gain from supply by play with <targets>
+    # (e.g. curses of attack), at most; second play by throne room can't
+    # count on them
+    @classmethod
+    def othersGain(cls, game, targets):
+        return []
     def bonusScores(self, game):
         return 0
+    # bonus of single card given count vector of all owner's cards
+    @classmethod
+    def countedBonusScores(cls, counts, total):
+        return 0
     def scores(self, game):
         return self.score + self.bonusScores(game)
 
@@ -66,8 +162,11 @@ class Attack(Action):
             if player is not active:
                 for card in player.hand.cards:
                     if card.hasType(Reaction):
-                        if card.whenAnotherPlayerPlaysAttack(player, self):
+                        blocked = bool(card.whenAnotherPlayerPlaysAttack(player, self))
+                        if blocked:
                             affected = False
+                        for handler in game.events.onReaction:
+                            handler(player, card, self, blocked)
             if affected:
                 self.affect(active, player, game)
 
@@ -86,6 +185,9 @@ class Curse(Card):
     score = -1
     def play(self, game, targets=[]):
         raise RulesViolation("Can't play curse")
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return []
 
 
 class Copper(Treasure):
@@ -132,6 +234,9 @@ class Gardens(Victory):
     cost = 4
     def bonusScores(self, game):
         return (self.zone.count() // 10) * 1
+    @classmethod
+    def countedBonusScores(cls, counts, total):
+        return (total // 10) * 1
 
 
 class Village(Action):
@@ -163,7 +268,7 @@ class Witch(Attack):
     def affect(self, player, other, game):
         if other is not player:
             if game.supply.countCards(Curse) > 0:
-                other.discard.put(game.supply.pickCard(Curse))
+                other.gain(Curse)
 class Moneylender(Action):
     setname = 'Base'
     cost = 4
@@ -171,8 +276,16 @@ class Moneylender(Action):
         Action.play(self, game, targets)
         player = game.activePlayer()
         if player.hand.countCards(Copper) > 0 and Copper in targets:
-            player.drop(Copper, game.trash)
+            player.trash(Copper)
             player.money += 3
+    @classmethod
+    def targetChoices(cls, game, hand):
+        if hand.get(Copper, 0) > 0:
+            return [[], [Copper]]
+        return [[]]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return withoutCards(hand, targets), []
 class Militia(Attack):
     setname = 'Base'
     cost = 4
@@ -234,8 +347,18 @@ class Mine(Action):
             raise RulesViolation("Can't mine <{}> to <{}>: maximum +3 cost".format(to_trash, to_mine))
         if game.supply.countCards(to_mine) <= 0:
             raise RulesViolation("Can't mine <{}>: not present in supply".format(to_mine))
-        player.drop(to_trash, game.trash)
-        player.hand.put(game.supply.pickCard(to_mine))
+        player.trash(to_trash)
+        player.gain(to_mine, player.hand)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[to_trash, to_mine]
+                for to_trash in byTypeId(hand) if to_trash.hasType(Treasure)
+                for to_mine in gainable(game, mask=TREASURE)
+                if to_mine.cost <= to_trash.cost + 3]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        to_trash, to_mine = targets
+        return withCard(withoutCard(hand, to_trash), to_mine), [to_mine]
 class Chapel(Action):
     setname = 'Base'
     cost = 2
@@ -243,7 +366,13 @@ class Chapel(Action):
         Action.play(self, game, targets)
         player = game.activePlayer()
         for card in targets[:4]:
-            player.drop(card, game.trash)
+            player.trash(card)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return cardSets(hand, max_size=4)
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return withoutCards(hand, targets), []
 class Cellar(Action):
     setname = 'Base'
     cost = 2
@@ -254,15 +383,21 @@ class Cellar(Action):
         for card in targets:
             player.drop(card)
         player.draw(len(targets))
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return cardSets(hand)
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return withoutCards(hand, targets), []
 class Bureaucrat(Attack):
     setname = 'Base'
     cost = 4
     def affect(self, player, other, game):
         if player is other:
             return
-        choices = set([c.name() for c in player.hand.cards if c.hasType(Victory)])
+        choices = distinct([c.name() for c in player.hand.cards if c.hasType(Victory)])
         if len(choices) == 1:
-            player.drop(list(choices)[0], player.deck)
+            player.drop(choices[0], player.deck)
         elif len(choices) > 1:
             while True:
                 to_put = player.strategy.putForBureaucrat(choices)
@@ -272,13 +407,20 @@ class Bureaucrat(Attack):
     def play(self, game, targets):
         Attack.play(self, game, targets)
         if game.supply.countCards(Silver) > 0:
-            game.activePlayer().deck.put(game.supply.pickCard(Silver))
+            player = game.activePlayer()
+            player.gain(Silver, player.deck)
 class Workshop(Action):
     setname = 'Base'
     cost = 3
     def play(self, game, targets):
         Action.play(self, game, targets)
-        game.activePlayer().discard.put(game.supply.pickCard(targets[0]))
+        game.activePlayer().gain(targets[0])
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[card_type] for card_type in gainable(game, 4)]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return hand, targets
 class Moat(Reaction):
     setname = 'Base'
     cost = 2
@@ -295,10 +437,19 @@ class Remodel(Action):
         to_trash, to_model = targets[:2]
         if game.supply.countCards(to_model) <= 0:
             raise RulesViolation("Can't remodel <{}>: not present on supply".format(to_model))
-        if game.currentCost(to_trash) + 2 > game.currentCost(to_model):
+        if game.currentCost(to_model) > game.currentCost(to_trash) + 2:
             raise RulesViolation("Can't remodel <{}> => <{}>: cost violation".format(to_trash, to_model))
-        player.drop(to_trash, game.trash)
-        player.discard.put(game.supply.pickCard(to_model))
+        player.trash(to_trash)
+        player.gain(to_model)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[to_trash, to_model] for to_trash in byTypeId(hand)
+                for to_model in gainable(game,
+                    game.currentCost(to_trash) + 2)]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        to_trash, to_model = targets
+        return withoutCard(hand, to_trash), [to_model]
 class ThroneRoom(Action):
     setname = 'Base'
     cost = 4
@@ -323,6 +474,34 @@ class ThroneRoom(Action):
             player.hand.put(card)
             raise
         player.played.put(card)
+    # targets of second play are chosen of cards left in hand and supply
+    # after the first one (see Card.afterPlay() and Card.othersGain()),
+    # cards which can't be played twice and throne room itself are not
+    # offered
+    @classmethod
+    def targetChoices(cls, game, hand):
+        choices = []
+        for to_dup in byTypeId(hand):
+            if not to_dup.hasType(Action) or to_dup is ThroneRoom:
+                continue
+            rest = withoutCard(hand, to_dup)
+            for targets1 in to_dup.targetChoices(game, rest):
+                after = to_dup.afterPlay(game, rest, targets1)
+                if after is None:
+                    continue
+                rest1, gained1 = after
+                taken1 = gained1 + to_dup.othersGain(game, targets1)
+                for targets2 in to_dup.targetChoices(game, rest1):
+                    after = to_dup.afterPlay(game, rest1, targets2)
+                    if after is None:
+                        continue
+                    gained2 = after[1]
+                    if all(taken1.count(card_type) +
+                           gained2.count(card_type) <=
+                           game.supply.countCards(card_type)
+                           for card_type in set(gained2)):
+                        choices.append([to_dup, targets1, targets2])
+        return choices
 
 ########################################
 ###  BASE - 1st EDITION SET OF CARDS ###
@@ -342,8 +521,15 @@ class Feast(Action):
         card = targets[0]
         if game.currentCost(card) > 5:
             raise RulesViolation("Cost of card must be not greater that 5")
-        game.trash.put(player.played.pick(self))
-        player.discard.put(game.supply.pickCard(card))
+        player.trash(self, player.played)
+        player.gain(card)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[card_type] for card_type in gainable(game, 5)]
+    # trashes itself of played cards, where throne room doesn't put it
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return None
 class Chancellor(Action):
     setname = 'Base1E'
     cost = 3
@@ -353,8 +539,7 @@ class Chancellor(Action):
         player = game.activePlayer()
         if player.deck.count() > 0:
             if player.strategy.shuffleForChancellor():
-                while player.deck.count() > 0:
-                    player.discard.put(player.deck.pick())
+                player.deck.moveAll(player.discard)
 class Adventurer(Action):
     setname = 'Base1E'
     cost = 6
@@ -396,7 +581,7 @@ class Thief(Attack):
         if len(candidates) == 0:
             return
         to_trash = player.strategy.trashForThief(other, candidates)
-        other.drop(to_trash, game.trash)
+        other.trash(to_trash)
         self.trashed.append(to_trash)
         for card in candidates:
             if card is not to_trash:
@@ -407,7 +592,7 @@ class Thief(Attack):
         player = game.activePlayer()
         if len(self.trashed) > 0:
             for card in player.strategy.takeForThief(self.trashed):
-                player.discard.put(game.trash.pick(card))
+                player.gain(card, from_zone=game.trash)
         self.trashed = []
 
 ########################################
@@ -443,7 +628,7 @@ class Sentry(Action):
         cards = player.draw(2)
         to_trash, to_discard, order = player.strategy.placeForSentry(cards)
         for card in to_trash:
-            player.drop(card, game.trash)
+            player.trash(card)
         for card in to_discard:
             player.drop(card, player.discard)
         to_deck = [c for c in cards if c not in to_trash and c not in to_discard]
@@ -460,7 +645,7 @@ class Poacher(Action):
     def play(self, game, targets):
         Action.play(self, game, targets)
         player = game.activePlayer()
-        cnt = game.supply.emptyTypes()
+        cnt = game.emptyPilesCount(include_curse=True)
         if cnt >= player.hand.count():
             to_discard = player.hand.cards
         else:
@@ -469,6 +654,19 @@ class Poacher(Action):
             to_discard = targets[:cnt]
         for card in to_discard:
             player.drop(card)
+    # hand gets one more card before discarding
+    @classmethod
+    def targetChoices(cls, game, hand):
+        cnt = game.emptyPilesCount(include_curse=True)
+        if cnt == 0 or cnt > sum(hand.values()):
+            return [[]]
+        return cardSets(hand, size=cnt)
+    # cards to discard by second play depend on cards drawn by both plays
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        if game.emptyPilesCount(include_curse=True) > 0:
+            return None
+        return hand, []
 class Harbinger(Action):
     setname = 'Base2E'
     cost = 3
@@ -495,23 +693,37 @@ class Bandit(Attack):
         elif len(candidates) > 1:
             to_trash = other.strategy.trashForBandit(player, candidates)
         for card in candidates:
-            other.drop(card, game.trash if card is to_trash else other.discard)
+            if card is to_trash:
+                other.trash(card)
+            else:
+                other.drop(card, other.discard)
     def play(self, game, targets):
         Attack.play(self, game, targets)
         player = game.activePlayer()
         if game.supply.countCards(Gold) > 0:
-            player.discard.put(game.supply.pickCard(Gold))
+            player.gain(Gold)
 class Artisan(Action):
     setname = 'Base2E'
     cost = 6
     def play(self, game, targets):
-        Attack.play(self, game, targets)
+        Action.play(self, game, targets)
         player = game.activePlayer()
         to_gain, to_put = targets[:2]
         if game.currentCost(to_gain) > 5:
             raise RulesViolation("Can't gain <{}>: too big cost".format(to_gain))
-        player.hand.put(game.supply.pickCard(to_gain))
+        player.gain(to_gain, player.hand)
         player.drop(to_put, player.deck)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        choices = []
+        for to_gain in gainable(game, 5):
+            for to_put in byTypeId(set(hand) | set([to_gain])):
+                choices.append([to_gain, to_put])
+        return choices
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        to_gain, to_put = targets
+        return withoutCard(withCard(hand, to_gain), to_put), [to_gain]
 
 ##############################
 ###  INTRIGUE SET OF CARDS ###
@@ -527,9 +739,18 @@ class Steward(Action):
             player.money += 2
         elif len(targets) >= 2:
             for card in targets[:2]:
-                player.drop(card, game.trash)
+                player.trash(card)
         else:
             player.draw(2)
+    # single target of any type is a choice of drawing
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[], [cls]] + cardSets(hand, size=2)
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        if len(targets) >= 2:
+            return withoutCards(hand, targets), []
+        return hand, []
 class Swindler(Attack):
     setname = 'Intrigue'
     cost = 3
@@ -537,7 +758,7 @@ class Swindler(Attack):
     def affect(self, player, other, game):
         if player is not other:
             for card in other.draw():
-                game.trash.put(card)
+                other.trash(card)
                 candidates = [c for c, l in game.supply.piles.items()
                     if len(l) > 0 and game.currentCost(c) == game.currentCost(card)]
                 if len(candidates) == 0:
@@ -546,7 +767,7 @@ class Swindler(Attack):
                     choice = candidates[0]
                 else:
                     choice = player.strategy.takeForSwindler(other, candidates)
-                other.discard.put(game.supply.pickCard(choice))
+                other.gain(choice)
 class Torturer(Attack):
     setname = 'Intrigue'
     cost = 5
@@ -556,7 +777,7 @@ class Torturer(Attack):
             discard = other.strategy.discardForTorturer(other)
             if discard is None:
                 if game.supply.countCards(Curse) > 0:
-                    other.discard.put(game.supply.pickCard(Curse))
+                    other.gain(Curse)
                 return
             if len(discard) < 2:
                 if len(player.hand.cards) >= 2:
@@ -572,17 +793,23 @@ class TradingPost(Action):
         player = game.activePlayer()
         if len(targets) >= 2:
             for card in targets[:2]:
-                player.drop(card, game.trash)
+                player.trash(card)
             if game.supply.countCards(Silver) > 0:
-                player.hand.put(game.supply.pickCard(Silver))
+                player.gain(Silver, player.hand)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[]] + cardSets(hand, size=2)
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return withoutCards(hand, targets), []
 class Pawn(Action):
     setname = 'Intrigue'
     cost = 2
     def play(self, game, targets):
         Action.play(self, game, targets)
         player = game.activePlayer()
-        choices = set(player.strategy.choicesForPawn())
-        for choice in list(choices)[:2]:
+        choices = distinct(player.strategy.choicesForPawn())
+        for choice in choices[:2]:
             if choice == "card":
                 player.draw()
             elif choice == "action":
@@ -602,13 +829,17 @@ class Nobles(Action, Victory):
             player.draw(3)
         else:
             player.actions += 2
+    # any target is a choice of drawing
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[], [cls]]
 class Minion(Attack):
     setname = 'Intrigue'
     cost = 5
     actions = 1
     def affect(self, player, other, game):
         if other is player or other.hand.count() >= 5:
-            other.discard.mix(other.hand)
+            other.hand.moveAll(other.discard)
             other.draw(4)
     def play(self, game, targets):
         player = game.activePlayer()
@@ -617,6 +848,15 @@ class Minion(Attack):
         else:
             Action.play(self, game, targets)
             player.money += 2
+    # any target is a choice of attack
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[], [cls]]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        if len(targets) > 0:
+            return {}, []
+        return hand, []
 
 class MiningVillage(Action):
     setname = 'Intrigue'
@@ -627,8 +867,18 @@ class MiningVillage(Action):
         Action.play(self, game, targets)
         player = game.activePlayer()
         if len(targets) > 0:
-            game.trash.put(player.played.pick(self))
+            player.trash(self, player.played)
             player.money += 2
+    # any target is a choice of trashing mining village
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[], [cls]]
+    # trashes itself of played cards, where throne room doesn't put it
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        if len(targets) > 0:
+            return None
+        return hand, []
 class Masquerade(Action):
     setname = 'Intrigue'
     cost = 3
@@ -649,7 +899,7 @@ class Masquerade(Action):
             p2.hand.put(p1.hand.pick(choices[i]))
         card = player.strategy.trashForMasquerade()
         if card is not None:
-            player.drop(card, game.trash)
+            player.trash(card)
 class ShantyTown(Action):
     setname = 'Intrigue'
     cost = 3
@@ -657,7 +907,7 @@ class ShantyTown(Action):
     def play(self, game, targets):
         Action.play(self, game, targets)
         player = game.activePlayer()
-        nactions = len([c for c in player.hand if c.hasType(Action)])
+        nactions = len([c for c in player.hand.cards if c.hasType(Action)])
         if nactions == 0:
             player.draw(2)
 class Conspirator(Action):
@@ -680,6 +930,16 @@ class Courtyard(Action):
         if len(targets) == 0:
             targets = [player.strategy.putForCourtyard()]
         player.deck.put(player.hand.pick(targets[0]))
+    # without targets card to put is chosen by strategy after drawing
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[]] + [[card_type] for card_type in byTypeId(hand)]
+    # card put by strategy may be any card of hand
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        if len(targets) == 0:
+            return {}, []
+        return withoutCard(hand, targets[0]), []
 class Baron(Action):
     setname = 'Intrigue'
     cost = 4
@@ -692,7 +952,15 @@ class Baron(Action):
             player.drop(Estate)
             player.money += 4
         elif game.supply.countCards(Estate) > 0:
-            player.discard.put(game.supply.pickCard(Estate))
+            player.gain(Estate)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        if hand.get(Estate, 0) > 0:
+            return [[], [Estate]]
+        return [[]]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return withoutCards(hand, targets), []
 class Bridge(Action):
     setname = 'Intrigue'
     cost = 4
@@ -706,6 +974,9 @@ class Duke(Victory):
     cost = 5
     def bonusScores(self, game):
         return self.zone.countCards(Duchy)
+    @classmethod
+    def countedBonusScores(cls, counts, total):
+        return counts[Duchy.type_id]
 class Harem(Treasure, Victory):
     setname = 'Intrigue'
     cost = 6
@@ -716,14 +987,21 @@ class IronWorks(Action):
     cost = 4
     def play(self, game, targets):
         Action.play(self, game, targets)
+        player = game.activePlayer()
         card = targets[0]
-        game.activePlayer().discard.put(game.supply.pickCard(card))
-        if card.hasType(Acton):
+        player.gain(card)
+        if card.hasType(Action):
             player.actions += 1
         if card.hasType(Treasure):
             player.money += 1
         if card.hasType(Victory):
             player.draw()
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[card_type] for card_type in gainable(game, 4)]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return hand, targets
 class WishingWell(Action):
     setname = 'Intrigue'
     cost = 3
@@ -737,6 +1015,10 @@ class WishingWell(Action):
         for card in player.draw():
             if card.name() != targets[0].name():
                 player.drop(card, player.deck)
+    # without targets guess is made by strategy
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[]] + [[card_type] for card_type in byTypeId(game.supply.piles)]
 class Upgrade(Action):
     setname = 'Intrigue'
     cost = 5
@@ -750,8 +1032,18 @@ class Upgrade(Action):
             raise RulesViolation("Can't upgrade <{}>: not present on supply".format(to_upgrade))
         if game.currentCost(to_trash) + 1 != game.currentCost(to_upgrade):
             raise RulesViolation("Can't upgrade <{}> => <{}>: cost violation".format(to_trash, to_upgrade))
-        player.drop(to_trash, game.trash)
-        player.discard.put(game.supply.pickCard(to_upgrade))
+        player.trash(to_trash)
+        player.gain(to_upgrade)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[to_trash, to_upgrade] for to_trash in byTypeId(hand)
+                for to_upgrade in gainable(game)
+                if game.currentCost(to_upgrade) ==
+                   game.currentCost(to_trash) + 1]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        to_trash, to_upgrade = targets
+        return withoutCard(hand, to_trash), [to_upgrade]
 
 ############################################
 ###  INTRIGUE - 1st EDITION SET OF CARDS ###
@@ -768,10 +1060,10 @@ class Saboteur(Attack):
             for card in other.draw():
                 cost = game.currentCost(card)
                 if cost >= 3:
-                    other.drop(card, game.trash)
+                    other.trash(card)
                     new_card = other.strategy.gainForSaboteur(cost - 2)
                     if new_card is not None and game.currentCost(new_card) <= cost - 2:
-                        other.discard.put(game.supply.pickCard(new_card))
+                        other.gain(new_card)
                     return
                 other.drop(card)
 class Tribute(Action):
@@ -819,6 +1111,12 @@ class SecretChamber(Reaction):
         for card in targets:
             player.drop(card)
             player.money += 1
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return cardSets(hand)
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return withoutCards(hand, targets), []
 class Scout(Action):
     setname = 'Intrigue1E'
     cost = 4
@@ -849,8 +1147,8 @@ class Courtier(Action):
         player = game.activePlayer()
         ntypes = sum([int(targets[0].hasType(T)) for T in
             [Curse, Treasure, Victory, Action, Attack, Reaction]])
-        choices = set(player.strategy.choicesForCourtier(ntypes))
-        for choice in list(choices)[:ntypes]:
+        choices = distinct(player.strategy.choicesForCourtier(ntypes))
+        for choice in choices[:ntypes]:
             if choice == "action":
                 player.actions += 1
             elif choice == "buy":
@@ -858,7 +1156,10 @@ class Courtier(Action):
             elif choice == "money":
                 player.money += 3
             elif choice == "gold" and game.supply.countCards(Gold) > 0:
-                player.discard.put(game.supply.pickCard(Gold))
+                player.gain(Gold)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[card_type] for card_type in byTypeId(hand)]
 class Lurker(Action):
     setname = 'Intrigue2E'
     cost = 2
@@ -876,9 +1177,9 @@ class Lurker(Action):
         if len(can_trash) > 0 or len(can_take) > 0:
             to_trash, to_take = player.strategy.chooseForLurker(can_trash, can_take)
             if to_trash is not None:
-                game.trash.put(game.supply.pickCard(to_trash))
+                player.trash(to_trash, game.supply)
             else:
-                player.discard.put(game.trash.pick(to_take))
+                player.gain(to_take, from_zone=game.trash)
 class Mill(Action, Victory):
     setname = 'Intrigue2E'
     cost = 4
@@ -892,6 +1193,12 @@ class Mill(Action, Victory):
             for card in targets[:2]:
                 player.drop(card)
             player.money += 2
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[]] + cardSets(hand, size=2)
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        return withoutCards(hand, targets), []
 class Replace(Attack):
     setname = 'Intrigue2E'
     cost = 5
@@ -899,22 +1206,35 @@ class Replace(Attack):
         if self.affect_curse:
             if other is not player:
                 if game.supply.countCards(Curse) > 0:
-                    other.discard.put(game.supply.pickCard(Curse))
+                    other.gain(Curse)
     def play(self, game, targets):
         player = game.activePlayer()
         to_trash, to_replace = targets[:2]
-        if game.supply.countCards(to_replacel) <= 0:
+        if game.supply.countCards(to_replace) <= 0:
             raise RulesViolation("Can't replace <{}>: not present on supply".format(to_replace))
-        if game.currentCost(to_trash) + 2 > game.currentCost(to_replace):
+        if game.currentCost(to_replace) > game.currentCost(to_trash) + 2:
             raise RulesViolation("Can't replace <{}> => <{}>: cost violation".format(to_trash, to_replace))
-        player.drop(to_trash, game.trash)
-        card = game.supply.pickCard(to_replace)
-        if card.hasType(Action) or card.hasType(Treasure):
-            player.deck.put(card)
+        player.trash(to_trash)
+        if to_replace.hasType(Action) or to_replace.hasType(Treasure):
+            card = player.gain(to_replace, player.deck)
         else:
-            player.discard.put(card)
+            card = player.gain(to_replace)
         self.affect_curse = card.hasType(Victory)
         Attack.play(self, game, targets)
+    @classmethod
+    def targetChoices(cls, game, hand):
+        return [[to_trash, to_replace] for to_trash in byTypeId(hand)
+                for to_replace in gainable(game,
+                    game.currentCost(to_trash) + 2)]
+    @classmethod
+    def afterPlay(cls, game, hand, targets):
+        to_trash, to_replace = targets
+        return withoutCard(hand, to_trash), [to_replace]
+    @classmethod
+    def othersGain(cls, game, targets):
+        if targets[1].hasType(Victory):
+            return [Curse] * (len(game.players) - 1)
+        return []
 class SecretPassage(Action):
     setname = 'Intrigue2E'
     cost = 4
@@ -925,7 +1245,7 @@ class SecretPassage(Action):
         player = game.activePlayer()
         N = player.hand.count()
         card, place = player.strategy.insertForSecretPassage(N)
-        player.deck.cards.insert(place, player.hand.pick(card))
+        player.deck.insert(player.hand.pick(card), place)
 class Diplomat(Reaction):
     setname = 'Intrigue2E'
     cost = 4
@@ -962,3 +1282,44 @@ class Patrol(Action):
             order = player.strategy.orderForPatrol(to_put)
         for i in order:
             player.drop(to_put[i], player.deck)
+
+
+##########################
+###  CARD TYPE REGISTRY ###
+##########################
+
+TREASURE = 1 << 0
+VICTORY = 1 << 1
+ACTION = 1 << 2
+ATTACK = 1 << 3
+REACTION = 1 << 4
+CURSE = 1 << 5
+
+TYPE_BITS = {
+    Treasure: TREASURE,
+    Victory: VICTORY,
+    Action: ACTION,
+    Attack: ATTACK,
+    Reaction: REACTION,
+    Curse: CURSE,
+}
+
+# CARD_TYPES[card_type.type_id] is card_type; ids are assigned in order
+# of class names, so they are the same in every process
+CARD_TYPES = []
+CARD_IDS = {}
+# cards which scores depend on other owner's cards
+BONUS_TYPES = []
+
+for _name, _cls in sorted(globals().items()):
+    if isinstance(_cls, type) and issubclass(_cls, Card):
+        _cls.type_id = len(CARD_TYPES)
+        _cls.type_mask = 0
+        for _base, _bit in TYPE_BITS.items():
+            if issubclass(_cls, _base):
+                _cls.type_mask |= _bit
+        CARD_IDS[_cls] = _cls.type_id
+        CARD_TYPES.append(_cls)
+        if _cls.countedBonusScores.__func__ is not Card.countedBonusScores.__func__:
+            BONUS_TYPES.append(_cls)
+del _name, _cls, _base, _bit
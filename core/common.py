@@ -3,3 +3,6 @@ class RulesViolation(Exception):
 
 class UnknownCard(Exception):
     pass
+
+class InvalidLog(Exception):
+    pass
@@ -17,9 +17,18 @@ for vname in dir(cards):
     except TypeError:
         pass
 
+# fast path of cardType(): card classes and exact names
+CARD_LOOKUP = dict(CARD_BY_NAME)
+CARD_LOOKUP.update((c, c) for c in cards.CARD_TYPES)
+
 
 def cardType(card):
     global CARD_BY_NAME
+    card_type = CARD_LOOKUP.get(card.__class__)
+    if card_type is None:
+        card_type = CARD_LOOKUP.get(card)
+    if card_type is not None:
+        return card_type
     if hasattr(card, 'name'):
         card = card.name()
     if hasattr(card, 'lower'):
@@ -29,6 +38,10 @@ def cardType(card):
     raise UnknownCard(str(card))
 
 
+def typeId(card):
+    return cardType(card).type_id
+
+
 def cardTypes(lst):
     return [
         cardTypes(card) if type(card) in (list, tuple) else cardType(card)
@@ -48,10 +61,104 @@ def cardsOfType(card_type):
     return ret
 
 
+class Listener(object):
+    # No-op stubs of all game events. Object subscribed to EventBus gets
+    # only events which methods differ from these stubs.
+    def onBuy(self, player, card_type):
+        pass
+    def onPlay(self, player, card, targets):
+        pass
+    def onNewActivePlayer(self, player):
+        pass
+    def onGameOver(self, score_table):
+        pass
+    def onGain(self, player, card):
+        pass
+    def onTrash(self, player, card):
+        pass
+    def onShuffle(self, player):
+        pass
+    def onReaction(self, player, card, attack, blocked):
+        pass
+    def onNewGame(self, game):
+        pass
+
+
+EVENTS = [name for name in dir(Listener) if name.startswith('on')]
+
+
+def isStub(method, stub):
+    func = getattr(method, '__func__', method)
+    if func is stub:
+        return True
+    code = getattr(func, '__code__', None)
+    return (code is not None and
+            code.co_code == stub.__code__.co_code and
+            code.co_consts == stub.__code__.co_consts)
+
+
+class EventBus(object):
+    # For every event keeps list of handlers, so dispatching is a loop over
+    # (usually empty) list: `for handler in game.events.onBuy: ...`
+    def __init__(self):
+        for event in EVENTS:
+            setattr(self, event, [])
+    def subscribe(self, listener):
+        for event in EVENTS:
+            method = getattr(listener, event, None)
+            if method is None or isStub(method, getattr(Listener, event)):
+                continue
+            getattr(self, event).append(method)
+    def unsubscribe(self, listener):
+        for event in EVENTS:
+            handlers = getattr(self, event)
+            handlers[:] = [h for h in handlers
+                           if getattr(h, '__self__', None) is not listener]
+
+
+def copyRandom(rng):
+    # faster than copy.deepcopy(rng)
+    ret = random.Random.__new__(random.Random)
+    ret.setstate(rng.getstate())
+    return ret
+
+
+def seatRandom(seed, nplayer):
+    # random stream of player's shuffles depending only on seed and seat
+    if seed is None:
+        return random.Random()
+    return random.Random("{}:{}".format(seed, nplayer))
+
+
+KINGDOM_CANDIDATES = {}
+
+
+def kingdomCandidates(set_names):
+    key = tuple(set_name.lower() for set_name in set_names)
+    if key not in KINGDOM_CANDIDATES:
+        KINGDOM_CANDIDATES[key] = [c for c in CARD_BY_NAME.values()
+            if c not in 
+                [cards.Curse, cards.Copper, cards.Silver, cards.Gold,
+                cards.Estate, cards.Duchy, cards.Province]
+                and any([c.setname is not None and
+                         set_name.startswith(c.setname.lower())
+                    for set_name in key])
+        ]
+    return KINGDOM_CANDIDATES[key]
+
+
 class PiledZone(object):
     def __init__(self):
         self.piles = dict()
         self.picked = dict()
+        self.owner = None
+        # id of zone within game and objects notified about every card
+        # movement, see Game.watch()
+        self.zone_id = None
+        self.watchers = ()
+        # number of empty (but not removed) non-curse and curse piles
+        self.empty_piles = 0
+        self.empty_curse_piles = 0
     def __str__(self):
         return "Total {} card(s):\n{}".format(self.count(),
             "\n".join(sorted([
@@ -67,17 +174,21 @@ class PiledZone(object):
         card_type = cardType(card_type)
         return self.picked.get(card_type, 0)
     def emptyPiles(self, include_curse=False):
-        return len([
-            card_type for card_type, pile in self.piles.items() 
-            if (include_curse or not card_type.hasType(cards.Curse)) and len(pile) == 0
-        ])
+        if include_curse:
+            return self.empty_piles + self.empty_curse_piles
+        return self.empty_piles
+    def countEmpty(self, card_type, delta):
+        if card_type.type_mask & cards.CURSE:
+            self.empty_curse_piles += delta
+        else:
+            self.empty_piles += delta
     def hasPile(self, card_type):
         try:
             card_type = cardType(card_type)
         except UnknownCard:
             return False
         return (card_type in self.piles)
-    def pickCards(self, card_or_type, count=1, remove_empty=False):
+    def pickCards(self, card_or_type, count=1, remove_empty=False, index=None):
         card_type = cardType(card_or_type)
         pile = self.piles.get(card_type, [])
         if len(pile) < count:
@@ -87,33 +198,140 @@ class PiledZone(object):
             pile.remove(card_or_type)
         else:
             ret = [pile.pop() for _ in range(count)]
-        if remove_empty and len(pile) == 0 and card_type in self.piles:
-            del self.piles[card_type]
+        if len(pile) == 0 and count > 0 and card_type in self.piles:
+            if remove_empty:
+                del self.piles[card_type]
+            else:
+                self.countEmpty(card_type, 1)
         self.picked[card_type] = self.picked.get(card_type, 0) + count
+        if self.owner is not None:
+            self.owner.ownCards(card_type, -count)
+        for watcher in self.watchers:
+            for card in ret:
+                watcher.zonePick(self, card, index)
         return ret
     def pickCard(self, card_or_type, remove_empty=False):
         return self.pickCards(card_or_type, count=1, remove_empty=remove_empty)[0]
-    def putCard(self, card):
+    def pick(self, card_or_type):
+        return self.pickCard(card_or_type)
+    def putCard(self, card, index=None):
         card_type = cardType(card)
         if card_type not in self.piles:
             self.piles[card_type] = []
+        elif len(self.piles[card_type]) == 0:
+            self.countEmpty(card_type, -1)
         self.piles[card_type].append(card)
+        if self.owner is not None:
+            self.owner.ownCards(card_type, 1)
+        for watcher in self.watchers:
+            watcher.zonePut(self, card, index)
     def putCards(self, cards):
         for card in cards:
             if card is not None:
                 self.putType(card)
-    def createPile(self, card_type, count=1):
+    def createPile(self, card_type, count=1, pool=None):
         card_type = cardType(card_type)
-        for _ in range(count):
-            card = card_type()
-            self.putCard(card)
+        if pool is None:
+            for _ in range(count):
+                card = card_type()
+                self.putCard(card)
+        else:
+            # reuse card objects from <pool>, creating missing ones
+            if card_type not in pool:
+                pool[card_type] = []
+            cached = pool[card_type]
+            while len(cached) < count:
+                cached.append(card_type())
+            self.putAll(None, {card_type: cached[:count]})
         return self.piles.get(card_type, None)
+    def takeAll(self):
+        piles = self.piles
+        self.piles = dict()
+        self.empty_piles = self.empty_curse_piles = 0
+        for card_type, pile in piles.items():
+            self.picked[card_type] = self.picked.get(card_type, 0) + len(pile)
+            if self.owner is not None:
+                self.owner.ownCards(card_type, -len(pile))
+        return None, piles
+    def takeCards(self, cards):
+        return [self.pick(card) for card in cards], None
+    def takeLast(self, cards):
+        # takes back <cards> which were the last ones put into zone, e.g.
+        # by putAll(), without counting them as picked
+        counts = {}
+        for card in cards:
+            card_type = cardType(card)
+            counts[card_type] = counts.get(card_type, 0) + 1
+        for card_type, count in counts.items():
+            pile = self.piles[card_type]
+            del pile[len(pile)-count:]
+            if len(pile) == 0:
+                del self.piles[card_type]
+            if self.owner is not None:
+                self.owner.ownCards(card_type, -count)
+    def putAll(self, cards, piles=None):
+        if piles is None:
+            piles = dict()
+            for card in cards:
+                card_type = cardType(card)
+                if card_type not in piles:
+                    piles[card_type] = []
+                piles[card_type].append(card)
+        for card_type, pile in piles.items():
+            if len(pile) == 0:
+                continue
+            if card_type in self.piles:
+                if len(self.piles[card_type]) == 0:
+                    self.countEmpty(card_type, -1)
+                self.piles[card_type].extend(pile)
+            else:
+                self.piles[card_type] = pile
+            if self.owner is not None:
+                self.owner.ownCards(card_type, len(pile))
+    def moveAll(self, other):
+        if self is other:
+            return
+        cards, piles = self.takeAll()
+        watchers = self.watchers or other.watchers
+        if watchers:
+            moved = cards if cards is not None else [
+                card for pile in piles.values() for card in pile]
+        other.putAll(cards, piles)
+        if watchers and len(moved) > 0:
+            for watcher in watchers:
+                watcher.zoneMoveAll(self, other, moved)
+    def moveCards(self, cards, other):
+        if self is other:
+            return
+        cards, piles = self.takeCards(cards)
+        other.putAll(cards, piles)
+        for watcher in other.watchers:
+            for card in cards:
+                watcher.zonePut(other, card, None)
+    def mix_to(self, other):
+        self.moveAll(other)
+    def mix_from(self, other):
+        other.moveAll(self)
+    def clone(self, rng=None):
+        # card objects are shared with the original zone; their
+        # back-reference to current zone (card.zone) is rewritten by
+        # whichever game moves them, so it is not valid across clones
+        zone = self.__class__.__new__(self.__class__)
+        zone.__dict__.update(self.__dict__)
+        zone.piles = {card_type: list(pile) for card_type, pile in self.piles.items()}
+        zone.picked = dict(self.picked)
+        zone.owner = None
+        zone.watchers = ()
+        if rng is not None:
+            zone.random = rng
+        return zone
 
 
 class OrderedZone(PiledZone):
-    def __init__(self):
+    def __init__(self, rng=random):
         PiledZone.__init__(self)
         self.cards = []
+        self.random = rng
     def count(self):
         return len(self.cards)
     def put(self, card):
@@ -124,81 +342,212 @@ class OrderedZone(PiledZone):
         card.zone = self
         self.cards.append(card)
         self.putCard(card)
+    def insert(self, card, index):
+        card.zone = self
+        self.cards.insert(index, card)
+        self.putCard(card, index)
     def pick(self, card_or_type=None):
         if card_or_type is None:
             if len(self.cards) == 0:
                 raise RulesViolation("Trying to pick card from empty zone")
-            card = self.cards[-1]
-        elif card_or_type in self.cards:
-            card = card_or_type
+            card = self.cards.pop()
+            index = len(self.cards)
         else:
-            card_type = cardType(card_or_type)
-            if self.countCards(card_type) == 0:
-                raise RulesViolation("Can't pick card of type <{}>: no such cards in zone".format(card_type))
-            card = [c for c in self.cards if c.hasType(card_type)][0]
-        self.cards.remove(card)
-        picked = self.pickCard(card, remove_empty=True)
+            if card_or_type in self.cards:
+                card = card_or_type
+            else:
+                card_type = cardType(card_or_type)
+                if self.countCards(card_type) == 0:
+                    raise RulesViolation("Can't pick card of type <{}>: no such cards in zone".format(card_type))
+                card = [c for c in self.cards if c.hasType(card_type)][0]
+            index = self.cards.index(card)
+            del self.cards[index]
+        picked = self.pickCards(card, 1, True, index)[0]
         picked.zone = None
         return picked
     def shuffle(self):
-        random.shuffle(self.cards)
-    def mix_to(self, other):
-        if self is other:
-            return
-        while self.count() > 0:
-            other.put(self.pick())
-    def mix_from(self, other):
-        if self is other:
+        previous = list(self.cards) if self.watchers else None
+        self.random.shuffle(self.cards)
+        for watcher in self.watchers:
+            watcher.zoneShuffle(self, previous)
+    def takeAll(self):
+        cards = self.cards
+        self.cards = []
+        return cards, PiledZone.takeAll(self)[1]
+    def putAll(self, cards, piles=None):
+        if cards is None:
+            cards = [card for pile in piles.values() for card in pile]
+        for card in cards:
+            card.zone = self
+        self.cards.extend(cards)
+        PiledZone.putAll(self, cards, piles)
+    def takeLast(self, cards):
+        del self.cards[len(self.cards)-len(cards):]
+        PiledZone.takeLast(self, cards)
+    def clone(self, rng=None):
+        zone = PiledZone.clone(self, rng)
+        zone.cards = list(self.cards)
+        return zone
+
+
+class CountedZone(PiledZone):
+    # Unordered zone: cards are kept only in per-type piles, so number of
+    # cards of each type is just a pile length and picking by type is O(1).
+    # Suitable for every zone where order of cards does not matter.
+    # <cards> is only a compatibility view: the list is rebuilt on the first
+    # access after every change, so code run every turn should use piles,
+    # count() and countCards() instead.
+    def __init__(self, rng=random):
+        PiledZone.__init__(self)
+        self.total = 0
+        self.random = rng
+        self._cards = None
+    @property
+    def cards(self):
+        if self._cards is None:
+            self._cards = [card for pile in self.piles.values() for card in pile]
+        return self._cards
+    def count(self):
+        return self.total
+    def put(self, card):
+        if type(card) in (tuple, list):
+            for c in card:
+                self.put(c)
             return
-        while other.count() > 0:
-            self.put(other.pick())
+        card.zone = self
+        self.putCard(card)
+        self.total += 1
+        self._cards = None
+    def insert(self, card, index):
+        self.put(card)
+    def pick(self, card_or_type=None):
+        if card_or_type is None:
+            if self.total == 0:
+                raise RulesViolation("Trying to pick card from empty zone")
+            card_or_type = next(iter(self.piles))
+        picked = self.pickCard(card_or_type, remove_empty=True)
+        self.total -= 1
+        self._cards = None
+        picked.zone = None
+        return picked
+    def shuffle(self):
+        pass
+    def takeAll(self):
+        self.total = 0
+        self._cards = None
+        return PiledZone.takeAll(self)
+    def putAll(self, cards, piles=None):
+        if cards is None:
+            cards = [card for pile in piles.values() for card in pile]
+        for card in cards:
+            card.zone = self
+        self.total += len(cards)
+        self._cards = None
+        PiledZone.putAll(self, cards, piles)
+    def takeLast(self, cards):
+        self.total -= len(cards)
+        self._cards = None
+        PiledZone.takeLast(self, cards)
+
+
+ZONE_BACKENDS = {
+    "ordered": OrderedZone,
+    "counted": CountedZone,
+}
 
 
 class Player(object):
-    def __init__(self, strategy, name=""):
+    def __init__(self, strategy, name="", rng=None):
         self.strategy = strategy
         self.strategy_name = self.strategy.__class__.__name__
         self.game = strategy.game
         self.name = name
-        self.deck = OrderedZone()
-        self.hand = OrderedZone()
-        self.played = OrderedZone()
-        self.discard = OrderedZone()
+        self.random = self.game.random if rng is None else rng
+        zone_cls = self.game.zone_cls
+        self.deck = OrderedZone(self.random)
+        self.hand = zone_cls(self.random)
+        self.played = zone_cls(self.random)
+        self.discard = zone_cls(self.random)
         self.zones = (self.deck, self.hand, self.played, self.discard)
+        # count vector of all player's cards (indexed by type_id) and
+        # running total of static victory points of these cards
+        self.owned = [0] * len(cards.CARD_TYPES)
+        self.owned_count = 0
+        self.owned_score = 0
+        for zone in self.zones:
+            zone.owner = self
     def init(self, nplayer):
         self.nplayer = nplayer
+        for n, zone in enumerate(self.zones):
+            zone.zone_id = 2 + len(self.zones) * (nplayer - 1) + n
         self.deck.put(self.game.supply.pickCards(cards.Copper, rules.INITIAL_COPPER))
         self.deck.put(self.game.supply.pickCards(cards.Estate, rules.INITIAL_ESTATES))
-        self.deck.shuffle()
+        self.shuffle()
         self.draw(rules.CARDS_PER_HAND)
         self.turns_taken = 0
         self.money = self.actions = self.buys = self.actions_played = 0
         self.strategy.setPlayer(self)
+    def ownCards(self, card_type, count):
+        self.owned[card_type.type_id] += count
+        self.owned_count += count
+        self.owned_score += card_type.score * count
     def count(self):
-        return sum([zone.count() for zone in self.zones])
+        return self.owned_count
     def countCards(self, card_type):
-        return sum([zone.countCards(card_type) for zone in self.zones])
+        return self.owned[cardType(card_type).type_id]
+    def scores(self):
+        total = self.owned_score
+        for card_type in cards.BONUS_TYPES:
+            n = self.owned[card_type.type_id]
+            if n > 0:
+                total += n * card_type.countedBonusScores(self.owned,
+                    self.owned_count)
+        return total
     def draw(self, count=1):
         drawn = []
         for _ in range(count):
             if self.deck.count() == 0:
                 if self.discard.count() == 0:
                     return drawn
-                self.discard.shuffle()
-                self.deck, self.discard = self.discard, self.deck
+                self.reshuffle()
             card = self.deck.pick()
             self.hand.put(card)
             drawn.append(card)
         return drawn
+    def shuffle(self):
+        self.deck.shuffle()
+        for handler in self.game.events.onShuffle:
+            handler(self)
+    def reshuffle(self):
+        self.discard.moveAll(self.deck)
+        self.shuffle()
     def drop(self, card_or_type, to_zone=None):
         if to_zone is None:
             to_zone = self.discard
         to_zone.put(self.hand.pick(card_or_type))
+    def gain(self, card_or_type, to_zone=None, from_zone=None):
+        if to_zone is None:
+            to_zone = self.discard
+        if from_zone is None:
+            from_zone = self.game.supply
+        card = from_zone.pick(card_or_type)
+        to_zone.put(card)
+        for handler in self.game.events.onGain:
+            handler(self, card)
+        return card
+    def trash(self, card_or_type, from_zone=None):
+        if from_zone is None:
+            from_zone = self.hand
+        card = from_zone.pick(card_or_type)
+        self.game.trash.put(card)
+        for handler in self.game.events.onTrash:
+            handler(self, card)
+        return card
     def countScores(self):
+        return (self.scores(), -self.turns_taken)
+    def gatherCards(self):
         for z in self.zones:
-            z.mix_to(self.deck)
-        total = sum([card.scores(self.game) for card in self.deck.cards])
-        return (total, -self.turns_taken)
+            z.moveAll(self.deck)
     def buy(self, card_or_type):
         card_type = cardType(card_or_type)
         if self.buys < 1:
@@ -210,29 +559,46 @@ class Player(object):
             raise RulesViolation("Can't buy: no such card in supply")
         self.buys -= 1
         self.money -= cost
-        card = self.game.supply.pickCard(card_type)
-        self.discard.put(card)
-        for player in self.game.players:
-            player.strategy.onBuy(self, card_type)
+        self.gain(card_type)
+        for handler in self.game.events.onBuy:
+            handler(self, card_type)
     def play(self, card_or_type, targets=[]):
         targets = cardTypes(targets)
         card = self.hand.pick(card_or_type)
         self.played.put(card)
         card.play(self.game, targets)
-        for player in self.game.players:
-            player.strategy.onPlay(self, card, targets)
+        for handler in self.game.events.onPlay:
+            handler(self, card, targets)
+    def clone(self, game, strategy, rng=None):
+        player = Player.__new__(Player)
+        player.__dict__.update(self.__dict__)
+        player.game = game
+        player.random = game.random if rng is None else rng
+        player.deck = self.deck.clone(player.random)
+        player.hand = self.hand.clone(player.random)
+        player.played = self.played.clone(player.random)
+        player.discard = self.discard.clone(player.random)
+        player.zones = (player.deck, player.hand, player.played, player.discard)
+        for zone in player.zones:
+            zone.owner = player
+        player.owned = list(self.owned)
+        player.strategy = strategy
+        player.strategy_name = strategy.__class__.__name__
+        return player
     def doTurn(self):
         self.actions = 1
         self.buys = 1
         self.money = 0
         self.actions_played = 0
-        
-        for phase in rules.TURN_PHASES:
+        self.doPhases(rules.TURN_PHASES)
+        self.endTurn()
+    def doPhases(self, phases):
+        for phase in phases:
             self.game.setPhase(phase)
             getattr(self.strategy, phase)()
-        
-        self.hand.mix_to(self.discard)
-        self.played.mix_to(self.discard)
+    def endTurn(self):
+        self.hand.moveAll(self.discard)
+        self.played.moveAll(self.discard)
         
         self.actions = 0
         self.buys = 0
@@ -244,63 +610,81 @@ class Player(object):
 
 class Game(object):
     def __init__(self, strategies, card_types=[], set_names=['Base1E'],
-                 first_player=None, seed=None):
-        random.seed(seed)
+                 first_player=None, seed=None, zones="ordered", crn=False):
+        # With <crn> (common random numbers) every seat shuffles with its
+        # own random stream depending only on seed, so in games with the
+        # same seed the same seat gets the same shuffles whoever sits there.
+        self.strategies = list(strategies)
+        self.crn = crn
+        self.nplayers = len(strategies)
+        self.zone_cls = ZONE_BACKENDS[zones]
+        self.card_types = cardTypes(card_types)
+        self.set_names = set_names
+        self.random = random.Random()
+        # all card objects ever created for this game, reused by reset()
+        self.card_pool = dict()
+        self.kingdom = None
+        # listeners subscribed to events and watchers of card movements in
+        # every game played, see listen() and watch()
+        self.listeners = []
+        self.watchers = []
+        self.reset(seed, first_player)
+    
+    def reset(self, seed=None, first_player=None, keep_kingdom=False):
+        # Starts new game with the same strategies reusing card objects
+        # of previous one; with <keep_kingdom> supply has the same kingdom
+        # cards as before, like if they were passed in constructor.
+        self.seed = seed
+        self.random.seed(seed)
         
-        self.nplayers = nplayers = len(strategies)
+        nplayers = self.nplayers
         
-        card_types = cardTypes(card_types)
-        if len(card_types) > rules.SUPPLY_PILES:
-            candidates = card_types
-            card_types = []
-        else:
-            candidates = [c for c in CARD_BY_NAME.values()
-                if c not in 
-                    [cards.Curse, cards.Copper, cards.Silver, cards.Gold,
-                    cards.Estate, cards.Duchy, cards.Province]
-                    and any([c.setname is not None and
-                             set_name.lower().startswith(c.setname.lower())
-                        for set_name in set_names])
-            ]
-        while len(card_types) < rules.SUPPLY_PILES:
-            card = candidates[random.randrange(0, len(candidates))]
-            if card not in card_types:
-                card_types.append(card)
+        if not keep_kingdom or self.kingdom is None:
+            self.kingdom = self.chooseKingdom()
         
         victory_cnt = (rules.VICTORY_CARDS_2_PLAYERS if nplayers == 2 else
                        rules.VICTORY_CARDS_3_PLAYERS if nplayers == 3 else
                        rules.VICTORY_CARDS_4_PLAYERS)
         
         self.supply = PiledZone()
-        for card_type in card_types:
+        self.supply.zone_id = 0
+        for card_type in self.kingdom:
             if card_type.hasType(cards.Victory):
                 count = victory_cnt
             else:
                 count = rules.ACTION_CARDS
-            self.supply.createPile(card_type, count)
+            self.supply.createPile(card_type, count, self.card_pool)
         
         self.supply.createPile(cards.Curse,
-            rules.TOTAL_CURSE_CARDS_PER_PLAYER * (nplayers - 1))
+            rules.TOTAL_CURSE_CARDS_PER_PLAYER * (nplayers - 1),
+            self.card_pool)
         
-        self.supply.createPile(cards.Copper, rules.TOTAL_COPPER_CARDS)
-        self.supply.createPile(cards.Silver, rules.TOTAL_SILVER_CARDS)
-        self.supply.createPile(cards.Gold, rules.TOTAL_GOLD_CARDS)
+        self.supply.createPile(cards.Copper, rules.TOTAL_COPPER_CARDS,
+            self.card_pool)
+        self.supply.createPile(cards.Silver, rules.TOTAL_SILVER_CARDS,
+            self.card_pool)
+        self.supply.createPile(cards.Gold, rules.TOTAL_GOLD_CARDS,
+            self.card_pool)
         
         self.supply.createPile(cards.Estate, victory_cnt +
-            rules.INITIAL_ESTATES * nplayers)
-        self.supply.createPile(cards.Duchy, victory_cnt)
-        self.supply.createPile(cards.Province, victory_cnt)
+            rules.INITIAL_ESTATES * nplayers, self.card_pool)
+        self.supply.createPile(cards.Duchy, victory_cnt, self.card_pool)
+        self.supply.createPile(cards.Province, victory_cnt, self.card_pool)
         
-        self.trash = OrderedZone()
+        self.trash = self.zone_cls(self.random)
+        self.trash.zone_id = 1
         
+        self.events = EventBus()
         self.players = []
-        for nplayer, strategy_cls in enumerate(strategies, 1):
+        for nplayer, strategy_cls in enumerate(self.strategies, 1):
             name = "#{} ({})".format(nplayer, strategy_cls.__name__)
             strategy = strategy_cls(self)
-            self.players.append(Player(strategy, name))
+            rng = seatRandom(seed, nplayer) if self.crn else None
+            self.players.append(Player(strategy, name, rng))
+            self.events.subscribe(strategy)
         
         if first_player is None:
-            first_player = random.randrange(0, nplayers)
+            first_player = self.random.randrange(0, nplayers)
         
         self.active_player = first_player
         
@@ -308,6 +692,56 @@ class Game(object):
             player.init(nplayer)
         
         self.phase = None
+        self.cost_modifier = 0
+        
+        self.attachWatchers()
+        for listener in self.listeners:
+            self.events.subscribe(listener)
+        for handler in self.events.onNewGame:
+            handler(self)
+    
+    def zones(self):
+        ret = [self.supply, self.trash]
+        for player in self.players:
+            ret.extend(player.zones)
+        return ret
+    
+    def listen(self, listener):
+        self.listeners.append(listener)
+        self.events.subscribe(listener)
+    
+    def unlisten(self, listener):
+        self.listeners.remove(listener)
+        self.events.unsubscribe(listener)
+    
+    def watch(self, watcher):
+        # <watcher> gets zonePick(zone, card, index), zonePut(zone, card,
+        # index), zoneMoveAll(src, dst, cards) and zoneShuffle(zone,
+        # previous_cards) calls; index is a position in ordered zone
+        self.watchers.append(watcher)
+        self.attachWatchers()
+    
+    def unwatch(self, watcher):
+        self.watchers.remove(watcher)
+        self.attachWatchers()
+    
+    def attachWatchers(self):
+        watchers = tuple(self.watchers)
+        for zone in self.zones():
+            zone.watchers = watchers
+    
+    def chooseKingdom(self):
+        card_types = list(self.card_types)
+        if len(card_types) > rules.SUPPLY_PILES:
+            candidates = card_types
+            card_types = []
+        else:
+            candidates = kingdomCandidates(self.set_names)
+        while len(card_types) < rules.SUPPLY_PILES:
+            card = candidates[self.random.randrange(0, len(candidates))]
+            if card not in card_types:
+                card_types.append(card)
+        return card_types
     
     def setPhase(self, phase):
         self.phase = phase
@@ -332,8 +766,55 @@ class Game(object):
         card_type = cardType(card_or_type)
         return card_type.cost + self.cost_modifier
     
+    def emptyPilesCount(self, include_curse=False):
+        return self.supply.emptyPiles(include_curse)
+    
+    def legalPlays(self):
+        # ("play", card type, targets) moves of active player in current
+        # phase, targets are listed by card types (see targetChoices())
+        player, phase = self.activeTurn()
+        if phase == "action" and player.actions > 0:
+            mask = cards.ACTION
+        elif phase == "buy":
+            mask = cards.TREASURE
+        else:
+            return []
+        hand = dict((card_type, len(pile))
+                    for card_type, pile in player.hand.piles.items()
+                    if len(pile) > 0)
+        moves = []
+        for card_type in cards.byTypeId(hand):
+            if not card_type.type_mask & mask:
+                continue
+            for targets in card_type.targetChoices(self,
+                    cards.withoutCard(hand, card_type)):
+                moves.append(("play", card_type, targets))
+        return moves
+    
+    def legalBuys(self):
+        # ("buy", card type, []) moves of active player affordable with
+        # money of already played treasures
+        player, phase = self.activeTurn()
+        if phase != "buy" or player.buys < 1:
+            return []
+        return [("buy", card_type, [])
+                for card_type in cards.gainable(self, player.money)]
+    
+    def legalMoves(self):
+        # all moves of active player besides ending current phase, which is
+        # always legal
+        return self.legalPlays() + self.legalBuys()
+    
+    def doMove(self, move):
+        action, card_type, targets = move
+        player = self.activePlayer()
+        if action == "play":
+            player.play(card_type, targets)
+        else:
+            player.buy(card_type)
+    
     def gameOver(self):
-        if self.supply.emptyPiles() >= rules.MAX_EMPTY_PILES:
+        if self.supply.empty_piles >= rules.MAX_EMPTY_PILES:
             return True
         if self.supply.countCards(cards.Province) == 0:
             return True
@@ -342,14 +823,67 @@ class Game(object):
     def turn(self):
         self.cost_modifier = 0
         player = self.activePlayer()
-        for p in self.players:
-            p.strategy.onNewActivePlayer(player)
+        for handler in self.events.onNewActivePlayer:
+            handler(player)
         player.doTurn()
+        return self.nextTurn()
+    
+    def nextTurn(self):
         if self.gameOver():
             return True
         self.active_player = (self.active_player + 1) % len(self.players)
         return False
     
+    def finishTurn(self, phases=None):
+        # plays rest of turn of active player, e.g. in game cloned in the
+        # middle of turn; by default starts from phase next to current one
+        player = self.activePlayer()
+        if phases is None:
+            phases = rules.TURN_PHASES
+            if self.phase in phases:
+                phases = phases[phases.index(self.phase)+1:]
+        player.doPhases(phases)
+        player.endTurn()
+        return self.nextTurn()
+    
+    def clone(self, strategies=None, seed=None):
+        # Copy of mutable game state sharing card objects and card types
+        # with original (card.zone is valid in neither after the copy is
+        # played, see PiledZone.clone()). Players of copy are driven by
+        # given strategy classes (single class for all or one per player),
+        # by default by new instances of the same strategies. RNG state is
+        # copied unless other seed is given.
+        game = Game.__new__(Game)
+        game.__dict__.update(self.__dict__)
+        # reset() of copy creates its own cards instead of taking ones
+        # still in play in original
+        game.card_pool = dict()
+        if seed is None:
+            game.random = copyRandom(self.random)
+        else:
+            game.random = random.Random(seed)
+        game.supply = self.supply.clone(game.random)
+        game.trash = self.trash.clone(game.random)
+        if strategies is None:
+            strategies = [p.strategy.__class__ for p in self.players]
+        elif type(strategies) not in (tuple, list):
+            strategies = [strategies] * len(self.players)
+        game.events = EventBus()
+        game.listeners = []
+        game.watchers = []
+        game.players = []
+        for player, strategy_cls in zip(self.players, strategies):
+            strategy = strategy_cls(game)
+            rng = None
+            if player.random is not self.random:
+                rng = (copyRandom(player.random) if seed is None else
+                       seatRandom(seed, player.nplayer))
+            game.players.append(player.clone(game, strategy, rng))
+            game.events.subscribe(strategy)
+        for player in game.players:
+            player.strategy.setPlayer(player)
+        return game
+    
     def scoreTable(self):
         table = [(player.countScores(), player.count(), i, player.name) 
                  for i, player in enumerate(self.players, 1)
@@ -365,7 +899,9 @@ class Game(object):
     def run(self):
         while not self.turn():
             pass
-        table = self.scoreTable()
         for player in self.players:
-            player.strategy.onGameOver(table)
+            player.gatherCards()
+        table = self.scoreTable()
+        for handler in self.events.onGameOver:
+            handler(table)
         return table
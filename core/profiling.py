@@ -0,0 +1,117 @@
+import cProfile
+import inspect
+import os
+import pstats
+import sys
+
+import core.cards
+import core.engine
+import core.rules
+
+
+def codeKey(code):
+    # functions are keyed by pstats this way
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def functionNames(modules):
+    # "Class.method" or "function" by code key of functions of <modules>,
+    # profiler itself knows only bare names of functions
+    names = {}
+    for module in modules:
+        for name, obj in vars(module).items():
+            if getattr(obj, '__module__', None) != module.__name__:
+                continue
+            if inspect.isclass(obj):
+                for attr, value in vars(obj).items():
+                    if isinstance(value, property):
+                        value = value.fget
+                    value = getattr(value, '__func__', value)
+                    if inspect.isfunction(value):
+                        names[codeKey(value.__code__)] = "{}.{}".format(
+                            obj.__name__, attr)
+            elif inspect.isfunction(obj):
+                names[codeKey(obj.__code__)] = name
+    return names
+
+
+def strategyModules(strategy_classes):
+    return sorted(set(sys.modules[cls.__module__] for cls in strategy_classes),
+                  key=lambda module: module.__name__)
+
+
+def otherName(key):
+    filename, line, name = key
+    if filename == '~':
+        # built-in function
+        return name
+    return "{}:{}({})".format(os.path.basename(filename), line, name)
+
+
+class Profiler(object):
+    # cProfile of everything run between enable() and disable() reported
+    # by groups of modules: engine (core.engine, core.rules), cards (so
+    # play() of every card class is seen separately, cards without own
+    # play() are counted in Card.play) and strategies.
+    def __init__(self, strategy_classes=()):
+        self.profile = cProfile.Profile()
+        self.groups = [
+            ("ENGINE", [core.engine, core.rules]),
+            ("CARDS", [core.cards]),
+            ("STRATEGIES", strategyModules(strategy_classes)),
+        ]
+    
+    def enable(self):
+        self.profile.enable()
+    
+    def disable(self):
+        self.profile.disable()
+    
+    def dump(self, path):
+        # for pstats, snakeviz, gprof2dot and so on
+        self.profile.dump_stats(path)
+    
+    def functions(self):
+        # {group: {name: [calls, self time, total time]}}, functions of
+        # no group are in "OTHER" by their file and name
+        names = dict((title, functionNames(modules))
+                     for title, modules in self.groups)
+        functions = dict((title, {}) for title, modules in self.groups)
+        functions["OTHER"] = {}
+        stats = pstats.Stats(self.profile).stats
+        for key, (ncalls, primitive, tottime, cumtime, _) in stats.items():
+            for title, modules in self.groups:
+                if key in names[title]:
+                    group, name = functions[title], names[title][key]
+                    break
+            else:
+                group = functions["OTHER"]
+                name = otherName(key)
+            entry = group.setdefault(name, [0, 0.0, 0.0])
+            entry[0] += ncalls
+            entry[1] += tottime
+            entry[2] += cumtime
+        return functions
+    
+    def report(self, limit=15, out=sys.stdout):
+        functions = self.functions()
+        total = sum(entry[1] for group in functions.values()
+                    for entry in group.values())
+        out.write("{:16s}\t{}\t{}\n".format("GROUP", "SELF, S", "%"))
+        for title, group in functions.items():
+            self_time = sum(entry[1] for entry in group.values())
+            out.write("{:16s}\t{:.3f}\t{:.1f}\n".format(title, self_time,
+                100.0 * self_time / max(total, 1e-9)))
+        for title, group in functions.items():
+            if len(group) == 0:
+                continue
+            # play() of cards includes everything it calls, so cards are
+            # sorted by total time, everything else by self time
+            column = 2 if title == "CARDS" else 1
+            out.write("\n{:32s}\t{}\t{}\t{}\t{}\n".format(title, "CALLS",
+                "SELF, S", "TOTAL, S", "US/CALL"))
+            for name, (ncalls, self_time, total_time) in sorted(group.items(),
+                    key=lambda item: item[1][column], reverse=True)[:limit]:
+                out.write("{:32s}\t{}\t{:.3f}\t{:.3f}\t{:.2f}\n".format(
+                    name, ncalls, self_time, total_time,
+                    1e6 * (self_time, total_time)[column-1] / max(1, ncalls)))
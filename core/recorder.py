@@ -0,0 +1,360 @@
+import gzip
+import os
+import zlib
+
+from core.common import InvalidLog
+
+import core.cards as cards
+
+
+# Binary game log is a sequence of records, every record is
+#   <length> <opcode> <arguments...>
+# where length (of opcode with arguments) and all integer arguments are
+# unsigned LEB128 varints, so most records take 3-5 bytes. Cards are
+# stored as their type ids (see core.cards.CARD_IDS), zones as zone ids:
+# 0 is supply, 1 is trash, then deck, hand, played and discard of every
+# player in seat order. Positions in deck are counted from the bottom,
+# deck order is listed from the bottom to the top.
+LOG_VERSION = 1
+
+OP_GAME = 1         # version, cards signature, seed, zones backend, players,
+                    # first player, kingdom card types, strategy names
+OP_KEYFRAME = 2     # turns played, active player, supply, trash and
+                    # every player's turns taken, deck and other zones
+OP_END = 3          # score table: scores, turns, cards, rank, winner
+OP_TURN = 4         # player, turns taken before this turn
+OP_BUY = 5          # player, card type
+OP_PLAY = 6         # player, card type, targets (see putTargets())
+OP_DRAW = 7         # player, card type (top of deck to hand)
+OP_SHUFFLE = 8      # deck zone, cards
+OP_MOVE = 9         # source zone, destination zone, card type [, positions]
+OP_PICK = 10        # zone, card type [, position]
+OP_PUT = 11         # zone, card type [, position + 1 or 0 for top]
+OP_MOVEALL = 12     # source zone, destination zone
+
+SUPPLY_ZONE = 0
+TRASH_ZONE = 1
+PLAYER_ZONES = ("deck", "hand", "played", "discard")
+
+# log is valid only for the same set of card types in the same order
+CARDS_SIGNATURE = zlib.crc32(
+    " ".join(card_type.name() for card_type in cards.CARD_TYPES).encode())
+
+# in place of card type starts nested list of targets
+TARGETS_GROUP = len(cards.CARD_TYPES)
+
+
+def isDeck(zone_id):
+    return zone_id >= 2 and (zone_id - 2) % len(PLAYER_ZONES) == 0
+
+
+def putVarint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def putSigned(out, value):
+    putVarint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def putString(out, value):
+    data = value.encode('utf-8')
+    putVarint(out, len(data))
+    out += data
+
+
+def putTargets(out, targets):
+    # number of targets and their card types, nested list of targets (e.g.
+    # targets of card played by throne room) is TARGETS_GROUP followed by
+    # its own number of targets and card types
+    putVarint(out, len(targets))
+    for target in targets:
+        if type(target) is list:
+            putVarint(out, TARGETS_GROUP)
+            putTargets(out, target)
+        else:
+            putVarint(out, target.type_id)
+
+
+def getVarint(data, pos):
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def getSigned(data, pos):
+    value, pos = getVarint(data, pos)
+    return (value >> 1) if value & 1 == 0 else -((value + 1) >> 1), pos
+
+
+def getString(data, pos):
+    length, pos = getVarint(data, pos)
+    return data[pos:pos+length].decode('utf-8'), pos + length
+
+
+def openLog(path, mode="rb"):
+    # logs are well compressible, so *.gz files are (un)packed on the fly
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def readVarint(stream):
+    value, shift = 0, 0
+    while True:
+        byte = stream.read(1)
+        if len(byte) == 0:
+            if shift > 0:
+                raise InvalidLog("Log is truncated")
+            return None
+        value |= (byte[0] & 0x7f) << shift
+        if byte[0] < 0x80:
+            return value
+        shift += 7
+
+
+def readRecords(stream):
+    # yields (opcode, arguments) for every record in <stream>, arguments
+    # are raw bytes to be decoded with get*() functions
+    while True:
+        length = readVarint(stream)
+        if length is None:
+            return
+        body = stream.read(length)
+        if len(body) < length or length == 0:
+            raise InvalidLog("Log is truncated")
+        yield body[0], body[1:]
+
+
+def truncateLog(path, ngames):
+    # Cuts log after its first <ngames> complete games (e.g. games of
+    # results recovered after interrupted run), so games played next are
+    # appended right after them; returns number of games kept, less than
+    # <ngames> if log has not so many.
+    if not os.path.exists(path):
+        return 0
+    kept, end = 0, 0
+    with openLog(path) as stream:
+        try:
+            for opcode, args in readRecords(stream):
+                if opcode == OP_END:
+                    kept += 1
+                    end = stream.tell()
+                    if kept == ngames:
+                        break
+        except (InvalidLog, EOFError):
+            # the rest of log written by interrupted run is cut off
+            pass
+    if not path.endswith(".gz"):
+        if end < os.path.getsize(path):
+            with open(path, "r+b") as log:
+                log.truncate(end)
+        return kept
+    # compressed log is copied up to the end of last kept game
+    temp_path = path + ".tmp"
+    with openLog(path) as src, gzip.open(temp_path, "wb") as dst:
+        while end > 0:
+            data = src.read(min(end, 1 << 20))
+            dst.write(data)
+            end -= len(data)
+    os.replace(temp_path, path)
+    return kept
+
+
+class Recorder(object):
+    # Listener and watcher writing binary log of every game it is attached
+    # to (see Game.listen() and Game.watch()); log of a game starts when
+    # recorder is attached or with Game.reset() and ends with game over.
+    # Full state of game is written every <keyframes> turns, so replay
+    # can start from any of them.
+    FLUSH_SIZE = 1 << 16
+    
+    def __init__(self, stream, keyframes=20):
+        self.stream = stream
+        self.keyframes = keyframes
+        self.buffer = bytearray()
+        self.pending = None
+        self.game = None
+        self.turn = 0
+    
+    def attach(self, game):
+        game.listen(self)
+        game.watch(self)
+        self.onNewGame(game)
+    
+    def detach(self, game):
+        game.unlisten(self)
+        game.unwatch(self)
+        self.flush()
+        self.game = None
+    
+    def flush(self):
+        if self.pending is not None:
+            self.flushPending()
+        self.stream.write(bytes(self.buffer))
+        del self.buffer[:]
+    
+    def record(self, opcode, *args):
+        if self.pending is not None:
+            self.flushPending()
+        buffer = self.buffer
+        if max(args) < 0x80:
+            # every argument fits single byte
+            buffer.append(len(args) + 1)
+            buffer.append(opcode)
+            buffer.extend(args)
+            return
+        body = bytearray((opcode,))
+        for arg in args:
+            putVarint(body, arg)
+        putVarint(buffer, len(body))
+        buffer += body
+    
+    def recordBody(self, body):
+        if self.pending is not None:
+            self.flushPending()
+        putVarint(self.buffer, len(body))
+        self.buffer += body
+        if len(self.buffer) >= self.FLUSH_SIZE:
+            self.flush()
+    
+    def flushPending(self):
+        # picked card has not been put immediately into other zone
+        zone, card, index = self.pending
+        self.pending = None
+        if isDeck(zone.zone_id):
+            self.record(OP_PICK, zone.zone_id, card.type_id, index)
+        else:
+            self.record(OP_PICK, zone.zone_id, card.type_id)
+    
+    def zonePick(self, zone, card, index):
+        if self.pending is not None:
+            self.flushPending()
+        self.pending = (zone, card, index)
+    
+    def zonePut(self, zone, card, index):
+        # picked card put immediately into other zone makes single record
+        dst = zone.zone_id
+        pending = self.pending
+        if pending is None or pending[1] is not card:
+            if isDeck(dst):
+                self.record(OP_PUT, dst, card.type_id,
+                    0 if index is None else index + 1)
+            else:
+                self.record(OP_PUT, dst, card.type_id)
+            return
+        self.pending = None
+        src_zone, _, src_index = pending
+        src = src_zone.zone_id
+        if not isDeck(src):
+            if isDeck(dst):
+                self.record(OP_MOVE, src, dst, card.type_id,
+                    0 if index is None else index + 1)
+            else:
+                # zone and type ids always fit single byte
+                self.buffer.extend((4, OP_MOVE, src, dst, card.type_id))
+        elif (index is None and dst == src + 1 and
+                src_index == len(src_zone.cards)):
+            self.buffer.extend((3, OP_DRAW, (src - 2) // len(PLAYER_ZONES),
+                card.type_id))
+        elif isDeck(dst):
+            self.record(OP_MOVE, src, dst, card.type_id, src_index,
+                0 if index is None else index + 1)
+        else:
+            self.record(OP_MOVE, src, dst, card.type_id, src_index)
+    
+    def zoneMoveAll(self, src, dst, moved):
+        self.record(OP_MOVEALL, src.zone_id, dst.zone_id)
+    
+    def zoneShuffle(self, zone, previous):
+        body = bytearray((OP_SHUFFLE,))
+        putVarint(body, zone.zone_id)
+        putVarint(body, len(zone.cards))
+        for card in zone.cards:
+            putVarint(body, card.type_id)
+        self.recordBody(body)
+    
+    def onNewGame(self, game):
+        if self.pending is not None:
+            self.flushPending()
+        self.game = game
+        self.turn = 0
+        body = bytearray((OP_GAME,))
+        putVarint(body, LOG_VERSION)
+        putVarint(body, CARDS_SIGNATURE)
+        putVarint(body, int(game.seed is not None))
+        putSigned(body, game.seed or 0)
+        putString(body, game.zone_cls.__name__)
+        putVarint(body, game.nplayers)
+        putVarint(body, game.active_player)
+        putVarint(body, len(game.kingdom))
+        for card_type in game.kingdom:
+            putVarint(body, card_type.type_id)
+        for player in game.players:
+            putString(body, player.strategy_name)
+        self.recordBody(body)
+        self.recordBody(self.keyframe(game))
+    
+    def keyframe(self, game):
+        body = bytearray((OP_KEYFRAME,))
+        putVarint(body, self.turn)
+        putVarint(body, game.active_player)
+        for zone in (game.supply, game.trash):
+            self.putCounts(body, zone)
+        for player in game.players:
+            putVarint(body, player.turns_taken)
+            putVarint(body, len(player.deck.cards))
+            for card in player.deck.cards:
+                putVarint(body, card.type_id)
+            for zone in player.zones[1:]:
+                self.putCounts(body, zone)
+        return body
+    
+    def putCounts(self, body, zone):
+        # supply keeps empty piles, so they are listed with zero count
+        piles = sorted((card_type.type_id, len(pile))
+                       for card_type, pile in zone.piles.items())
+        putVarint(body, len(piles))
+        for type_id, count in piles:
+            putVarint(body, type_id)
+            putVarint(body, count)
+    
+    def onNewActivePlayer(self, player):
+        if self.keyframes and self.turn > 0 and self.turn % self.keyframes == 0:
+            self.recordBody(self.keyframe(self.game))
+        self.turn += 1
+        self.record(OP_TURN, player.nplayer - 1, player.turns_taken)
+    
+    def onBuy(self, player, card_type):
+        self.record(OP_BUY, player.nplayer - 1, card_type.type_id)
+    
+    def onPlay(self, player, card, targets):
+        if any(type(target) is list for target in targets):
+            body = bytearray((OP_PLAY,))
+            putVarint(body, player.nplayer - 1)
+            putVarint(body, card.type_id)
+            putTargets(body, targets)
+            self.recordBody(body)
+            return
+        self.record(OP_PLAY, player.nplayer - 1, card.type_id, len(targets),
+            *[target.type_id for target in targets])
+    
+    def onGameOver(self, score_table):
+        body = bytearray((OP_END,))
+        putVarint(body, len(score_table))
+        for nplayer in sorted(score_table):
+            scores, turns, ncards, rank, winner, name = score_table[nplayer]
+            putSigned(body, scores)
+            putVarint(body, turns)
+            putVarint(body, ncards)
+            putVarint(body, rank)
+            putVarint(body, int(winner))
+        self.recordBody(body)
+        self.flush()
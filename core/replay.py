@@ -0,0 +1,287 @@
+import bisect
+
+from core.common import InvalidLog
+from core.recorder import readRecords, getVarint, getSigned, getString, \
+    isDeck, LOG_VERSION, CARDS_SIGNATURE, SUPPLY_ZONE, TRASH_ZONE, \
+    PLAYER_ZONES, OP_GAME, OP_KEYFRAME, OP_END, OP_TURN, OP_BUY, OP_PLAY, \
+    OP_DRAW, OP_SHUFFLE, OP_MOVE, OP_PICK, OP_PUT, OP_MOVEALL, TARGETS_GROUP
+
+import core.cards as cards
+
+
+def loadGame(stream, ngame=1):
+    # records of <ngame>-th (starting from 1) game in log
+    records = []
+    for opcode, args in readRecords(stream):
+        if opcode == OP_GAME:
+            ngame -= 1
+            if ngame < 0:
+                break
+        if ngame == 0:
+            records.append((opcode, args))
+    if len(records) == 0:
+        raise InvalidLog("No such game in log")
+    return records
+
+
+def getVarints(args):
+    ret, pos = [], 0
+    while pos < len(args):
+        value, pos = getVarint(args, pos)
+        ret.append(value)
+    return ret
+
+
+def getTargets(values, pos):
+    # targets written by putTargets() from decoded varints <values>
+    count = values[pos]
+    pos += 1
+    targets = []
+    for _ in range(count):
+        if values[pos] == TARGETS_GROUP:
+            group, pos = getTargets(values, pos + 1)
+            targets.append(group)
+        else:
+            targets.append(cards.CARD_TYPES[values[pos]])
+            pos += 1
+    return targets, pos
+
+
+class Replay(object):
+    # State of recorded game rebuilt from log without playing it. Zones are
+    # indexed by zone id: deck is a list of card type ids (from the bottom
+    # to the top), other zones are dicts of number of cards by type id.
+    # <turn> is a number of turns played, seek() jumps to any of them
+    # starting from the nearest keyframe.
+    def __init__(self, records):
+        self.records = records
+        opcode, args = records[0]
+        if opcode != OP_GAME:
+            raise InvalidLog("Log of game does not start with header")
+        version, pos = getVarint(args, 0)
+        if version != LOG_VERSION:
+            raise InvalidLog("Unsupported log version {}".format(version))
+        signature, pos = getVarint(args, pos)
+        if signature != CARDS_SIGNATURE:
+            raise InvalidLog("Log was written with other set of cards")
+        has_seed, pos = getVarint(args, pos)
+        seed, pos = getSigned(args, pos)
+        self.seed = seed if has_seed else None
+        self.zones_backend, pos = getString(args, pos)
+        self.nplayers, pos = getVarint(args, pos)
+        self.first_player, pos = getVarint(args, pos)
+        nkingdom, pos = getVarint(args, pos)
+        self.kingdom = []
+        for _ in range(nkingdom):
+            type_id, pos = getVarint(args, pos)
+            self.kingdom.append(cards.CARD_TYPES[type_id])
+        self.strategy_names = []
+        for _ in range(self.nplayers):
+            name, pos = getString(args, pos)
+            self.strategy_names.append(name)
+        # positions of keyframes and of records starting every turn
+        self.keyframes = []
+        self.turn_starts = []
+        self.score_table = None
+        for index, (opcode, args) in enumerate(records):
+            if opcode == OP_KEYFRAME:
+                self.keyframes.append((getVarint(args, 0)[0], index))
+            elif opcode == OP_TURN:
+                self.turn_starts.append(index)
+            elif opcode == OP_END:
+                self.score_table = self.decodeScoreTable(args)
+        if len(self.keyframes) == 0:
+            raise InvalidLog("Log of game has no keyframes")
+        self.turns = len(self.turn_starts)
+        self.turn = 0
+        self.index = None
+        self.seek(0)
+    
+    def decodeScoreTable(self, args):
+        table = {}
+        nplayers, pos = getVarint(args, 0)
+        for nplayer in range(1, nplayers+1):
+            scores, pos = getSigned(args, pos)
+            turns, pos = getVarint(args, pos)
+            ncards, pos = getVarint(args, pos)
+            rank, pos = getVarint(args, pos)
+            winner, pos = getVarint(args, pos)
+            table[nplayer] = (scores, turns, ncards, rank, bool(winner),
+                self.playerName(nplayer - 1))
+        return table
+    
+    def playerName(self, player):
+        return "#{} ({})".format(player + 1, self.strategy_names[player])
+    
+    def zoneId(self, player, zone_name):
+        return 2 + len(PLAYER_ZONES) * player + PLAYER_ZONES.index(zone_name)
+    
+    def seek(self, turn):
+        # state after <turn> turns are played
+        turn = max(0, min(turn, self.turns))
+        nkeyframe = bisect.bisect_right(self.keyframes, (turn, len(self.records)))
+        keyframe_turn, index = self.keyframes[nkeyframe - 1]
+        # going on from current state is not longer than from keyframe
+        if self.index is None or not (keyframe_turn <= self.turn <= turn):
+            self.loadKeyframe(self.records[index][1])
+            self.index = index + 1
+        self.playTo(turn)
+        return self
+    
+    def step(self):
+        # plays one turn, returns its events
+        self.events = []
+        self.playTo(self.turn + 1)
+        return self.events
+    
+    def playTo(self, turn):
+        if turn < self.turns:
+            stop = self.turn_starts[turn]
+        else:
+            stop = len(self.records)
+        while self.index < stop:
+            opcode, args = self.records[self.index]
+            self.index += 1
+            self.apply(opcode, args)
+    
+    def loadKeyframe(self, args):
+        self.events = []
+        self.turn, pos = getVarint(args, 0)
+        self.active_player, pos = getVarint(args, pos)
+        self.zones = {}
+        for zone_id in (SUPPLY_ZONE, TRASH_ZONE):
+            self.zones[zone_id], pos = self.decodeCounts(args, pos)
+        self.turns_taken = []
+        zone_id = TRASH_ZONE + 1
+        for _ in range(self.nplayers):
+            turns_taken, pos = getVarint(args, pos)
+            self.turns_taken.append(turns_taken)
+            ncards, pos = getVarint(args, pos)
+            deck = []
+            for _ in range(ncards):
+                type_id, pos = getVarint(args, pos)
+                deck.append(type_id)
+            self.zones[zone_id] = deck
+            for n in range(1, len(PLAYER_ZONES)):
+                self.zones[zone_id + n], pos = self.decodeCounts(args, pos)
+            zone_id += len(PLAYER_ZONES)
+    
+    def decodeCounts(self, args, pos):
+        counts = {}
+        npiles, pos = getVarint(args, pos)
+        for _ in range(npiles):
+            type_id, pos = getVarint(args, pos)
+            counts[type_id], pos = getVarint(args, pos)
+        return counts, pos
+    
+    def remove(self, zone_id, type_id, index=None):
+        zone = self.zones[zone_id]
+        if isDeck(zone_id):
+            if zone[index] != type_id:
+                raise InvalidLog("Log does not match state of replayed game")
+            del zone[index]
+            return
+        if zone.get(type_id, 0) == 0:
+            raise InvalidLog("Log does not match state of replayed game")
+        zone[type_id] -= 1
+        # supply keeps its empty piles
+        if zone[type_id] == 0 and zone_id != SUPPLY_ZONE:
+            del zone[type_id]
+    
+    def put(self, zone_id, type_id, position=0):
+        zone = self.zones[zone_id]
+        if not isDeck(zone_id):
+            zone[type_id] = zone.get(type_id, 0) + 1
+        elif position == 0:
+            zone.append(type_id)
+        else:
+            zone.insert(position - 1, type_id)
+    
+    def apply(self, opcode, args):
+        if opcode == OP_KEYFRAME:
+            return
+        if opcode == OP_END:
+            self.events.append((opcode, None, []))
+            return
+        args = getVarints(args)
+        if opcode == OP_DRAW:
+            player, type_id = args
+            deck_id = self.zoneId(player, "deck")
+            self.remove(deck_id, type_id, len(self.zones[deck_id]) - 1)
+            self.put(deck_id + 1, type_id)
+        elif opcode == OP_MOVE:
+            src, dst, type_id = args[:3]
+            if isDeck(src):
+                self.remove(src, type_id, args[3])
+            else:
+                self.remove(src, type_id)
+            self.put(dst, type_id, args[-1] if isDeck(dst) else 0)
+        elif opcode == OP_PICK:
+            self.remove(*args)
+        elif opcode == OP_PUT:
+            self.put(*args)
+        elif opcode == OP_MOVEALL:
+            src, dst = args
+            moved = self.zones[src]
+            if isDeck(src):
+                self.zones[src] = []
+                for type_id in moved:
+                    self.put(dst, type_id)
+            else:
+                self.zones[src] = {}
+                for type_id, count in sorted(moved.items()):
+                    for _ in range(count):
+                        self.put(dst, type_id)
+        elif opcode == OP_SHUFFLE:
+            zone_id, ncards = args[:2]
+            if sorted(args[2:]) != sorted(self.zones[zone_id]):
+                raise InvalidLog("Log does not match state of replayed game")
+            self.zones[zone_id] = args[2:]
+        elif opcode == OP_TURN:
+            player, turns_taken = args
+            self.turn += 1
+            self.active_player = player
+            self.turns_taken[player] = turns_taken + 1
+            self.events.append((opcode, player, []))
+        elif opcode == OP_BUY:
+            player, type_id = args
+            self.events.append((opcode, player, [cards.CARD_TYPES[type_id]]))
+        elif opcode == OP_PLAY:
+            player, type_id = args[:2]
+            targets, _ = getTargets(args, 2)
+            self.events.append((opcode, player,
+                [cards.CARD_TYPES[type_id]] + targets))
+        else:
+            raise InvalidLog("Unknown record opcode {}".format(opcode))
+    
+    def playerZone(self, player, zone_name):
+        # card types of zone, deck from the bottom to the top
+        zone = self.zones[self.zoneId(player, zone_name)]
+        if zone_name == "deck":
+            return [cards.CARD_TYPES[type_id] for type_id in zone]
+        return [cards.CARD_TYPES[type_id]
+                for type_id, count in sorted(zone.items())
+                for _ in range(count)]
+    
+    def supply(self):
+        return dict((cards.CARD_TYPES[type_id], count)
+                    for type_id, count in self.zones[SUPPLY_ZONE].items())
+    
+    def owned(self, player):
+        owned = [0] * len(cards.CARD_TYPES)
+        for zone_name in PLAYER_ZONES:
+            for card_type in self.playerZone(player, zone_name):
+                owned[card_type.type_id] += 1
+        return owned
+    
+    def scores(self, player):
+        owned = self.owned(player)
+        total = sum(owned)
+        scores = 0
+        for card_type, count in zip(cards.CARD_TYPES, owned):
+            if count > 0:
+                scores += count * card_type.score
+                if card_type in cards.BONUS_TYPES:
+                    scores += count * card_type.countedBonusScores(owned,
+                        total)
+        return scores
@@ -0,0 +1,101 @@
+import json
+import os
+import random
+
+import core.cache
+import core.engine
+import core.rules
+import core.tournament
+
+
+def sampleKingdoms(set_names, count, seed=None, card_types=[]):
+    # <count> different kingdoms with all of <card_types> and random cards
+    # of given sets; less if there are not so many different kingdoms
+    rng = random.Random(seed)
+    fixed = core.engine.cardTypes(card_types)
+    candidates = sorted((c for c in core.engine.kingdomCandidates(set_names)
+                         if c not in fixed), key=lambda c: c.name())
+    nrandom = core.rules.SUPPLY_PILES - len(fixed)
+    kingdoms, keys, attempts = [], set(), 0
+    while len(kingdoms) < count and attempts < 100 * count:
+        attempts += 1
+        kingdom = sorted(fixed + rng.sample(candidates, nrandom),
+            key=lambda c: c.name())
+        key = kingdomKey(kingdom)
+        if key not in keys:
+            keys.add(key)
+            kingdoms.append(kingdom)
+    return kingdoms
+
+
+def kingdomKey(kingdom):
+    return ",".join(sorted(card_type.name() for card_type in kingdom))
+
+
+def playCell(strategy_name, opponents, kingdom, seeds, jobs=1, cache=None,
+             pool=None, **game_args):
+    # results of <strategy_name> playing against <opponents> in <kingdom>
+    # all rotations of seats of every seed; sweep passes the same <pool>
+    # of core.tournament.startPool() to all cells
+    strategy_names = [strategy_name] + list(opponents)
+    games = core.tournament.schedule(len(strategy_names), seeds, rotate=True)
+    cell = {"games": 0, "wins": 0, "scores": 0, "rank": 0}
+    for result in core.tournament.playGames(strategy_names,
+            [card_type.name() for card_type in kingdom], games, jobs=jobs,
+            balanced=True, cache=cache, pool=pool, **game_args):
+        scores, turns, cards, rank, winner, name = result["table"][1]
+        cell["games"] += 1
+        cell["wins"] += int(winner)
+        cell["scores"] += scores
+        cell["rank"] += rank
+    return cell
+
+
+class SweepMatrix(object):
+    # Kingdom x strategy results kept in JSON file. Every cell stores key
+    # made of versions of strategy and its opponents, of rules and of sweep
+    # options, cells with other key are out of date and are played again.
+    def __init__(self, path):
+        self.path = path
+        self.kingdoms = {}
+        if os.path.exists(path):
+            with open(path) as matrix:
+                self.kingdoms = json.load(matrix)["kingdoms"]
+    
+    def cellKey(self, strategy_name, opponents, ngames, seed, game_args):
+        strategies = core.tournament.loadStrategies()
+        version = core.cache.strategyVersion
+        return json.dumps({
+            "strategy": [strategy_name, version(strategies[strategy_name])],
+            "opponents": [[name, version(strategies[name])]
+                          for name in opponents],
+            "rules": core.cache.rulesVersion(),
+            "ngames": ngames,
+            "seed": seed,
+            "options": sorted(game_args.items()),
+        }, sort_keys=True)
+    
+    def get(self, kingdom, strategy_name, key):
+        cells = self.kingdoms.get(kingdomKey(kingdom), {}).get("cells", {})
+        cell = cells.get(strategy_name)
+        if cell is None or cell["key"] != key:
+            return None
+        return cell
+    
+    def put(self, kingdom, strategy_name, key, cell):
+        row = self.kingdoms.setdefault(kingdomKey(kingdom), {
+            "cards": [card_type.name() for card_type in kingdom],
+            "cells": {},
+        })
+        cell = dict(cell, key=key)
+        row["cells"][strategy_name] = cell
+        return cell
+    
+    def save(self):
+        # written to temporary file first, so interrupted run does not
+        # corrupt matrix
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as matrix:
+            json.dump({"kingdoms": self.kingdoms}, matrix, indent=1,
+                sort_keys=True)
+        os.replace(temp_path, self.path)
@@ -0,0 +1,446 @@
+import functools
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import time
+
+import core.accounting
+import core.cache
+import core.engine
+import core.recorder
+
+
+STRATEGIES = None
+# games (with their turn timers) kept by playGame() for reuse, by
+# strategies, kingdom and options; dropped all at once when there are too
+# many (e.g. in kingdom sweeps)
+GAMES = {}
+MAX_GAMES = 64
+# win rates of two players are compared by exact sign test (see
+# RankingTest.pValue()) when at most this number of games was won by only
+# one of them
+SIGN_TEST_GAMES = 100
+
+
+def loadStrategies():
+    # strategy registry is scanned once per process (i.e. once per worker)
+    global STRATEGIES
+    if STRATEGIES is None:
+        from strategy import strategies
+        STRATEGIES = strategies
+    return STRATEGIES
+
+
+def gameSeeds(seed, ngames, first=1):
+    for ngame in range(first, ngames+1):
+        yield None if seed is None else seed + ngame
+
+
+def schedule(nplayers, seeds, rotate=False, round_robin=False):
+    # Yields (players, seed) for every game: <players> are indexes of
+    # strategies in seat order. With <rotate> every seed is played by all
+    # rotations of seats, with <round_robin> by all pairs of strategies
+    # (in both seats).
+    for seed in seeds:
+        if round_robin:
+            groups = itertools.combinations(range(nplayers), 2)
+        else:
+            groups = [tuple(range(nplayers))]
+        for group in groups:
+            if rotate or round_robin:
+                for n in range(len(group)):
+                    yield group[n:] + group[:n], seed
+            else:
+                yield group, seed
+
+
+class TurnTimer(object):
+    # Listener summing CPU time of turns of every player, i.e. of strategy
+    # and engine work done in them
+    def onNewGame(self, game):
+        self.times = dict((nplayer, 0.0)
+                          for nplayer in range(1, game.nplayers+1))
+        self.player = None
+        self.start = 0.0
+    
+    def onNewActivePlayer(self, player):
+        now = time.process_time()
+        self.stop(now)
+        self.player = player
+        self.start = now
+    
+    def onGameOver(self, score_table):
+        self.stop(time.process_time())
+    
+    def stop(self, now):
+        if self.player is not None:
+            self.times[self.player.nplayer] += now - self.start
+            self.player = None
+
+
+def playGame(strategy_names, card_types, seed, reuse=True, record=False,
+             first_player=None, accounting=False, **game_args):
+    # returns dict with seed, kingdom, seat order (player numbers in order
+    # of turns), score table of the game, CPU time of turns of every player,
+    # binary log of the game if <record> and calls of strategies methods
+    # (see core.accounting) if <accounting>
+    strategies = loadStrategies()
+    key = (tuple(strategy_names), tuple(card_types),
+           tuple(sorted(game_args.items())), accounting)
+    if reuse and key in GAMES:
+        game, timer, calls = GAMES[key]
+        game.reset(seed, first_player)
+    else:
+        players = [strategies[name] for name in strategy_names]
+        game = core.engine.Game(players, card_types=card_types, seed=seed,
+            first_player=first_player, **game_args)
+        timer = TurnTimer()
+        timer.onNewGame(game)
+        game.listen(timer)
+        calls = None
+        if accounting:
+            calls = core.accounting.CallAccounting()
+            calls.attach(game)
+        if reuse:
+            if len(GAMES) >= MAX_GAMES:
+                GAMES.clear()
+            GAMES[key] = (game, timer, calls)
+    result = {
+        "seed": seed,
+        "kingdom": [card_type.name() for card_type in game.kingdom],
+        "seats": [(game.active_player + n) % game.nplayers + 1
+                  for n in range(game.nplayers)],
+        "log": None,
+    }
+    if record:
+        stream = io.BytesIO()
+        recorder = core.recorder.Recorder(stream)
+        recorder.attach(game)
+        try:
+            result["table"] = game.run()
+        finally:
+            recorder.detach(game)
+        result["log"] = stream.getvalue()
+    else:
+        result["table"] = game.run()
+    result["cpu"] = dict(timer.times)
+    if calls is not None:
+        result["calls"] = calls.takeCalls()
+    return result
+
+
+def scheduledGame(strategy_names, scheduled, balanced=False, **game_args):
+    # strategy names in seat order, seed and options of game from schedule();
+    # <balanced> games always start from the first seat and use common
+    # random numbers
+    players, seed = scheduled
+    if balanced:
+        game_args.update(first_player=0, crn=True)
+    return [strategy_names[n] for n in players], seed, game_args
+
+
+def renumberResult(result, scheduled):
+    # score table and seats of result are numbered by positions of
+    # strategies in the whole tournament instead of seats
+    players, seed = scheduled
+    result = dict(result)
+    result["players"] = [n + 1 for n in players]
+    result["seats"] = [players[seat-1] + 1 for seat in result["seats"]]
+    result["table"] = dict((players[nplayer-1] + 1, row)
+                           for nplayer, row in result["table"].items())
+    if "cpu" in result:
+        result["cpu"] = dict((players[nplayer-1] + 1, seconds)
+                             for nplayer, seconds in result["cpu"].items())
+    return result
+
+
+def playScheduledGame(strategy_names, card_types, scheduled, balanced=False,
+                      **game_args):
+    names, seed, game_args = scheduledGame(strategy_names, scheduled,
+        balanced, **game_args)
+    return playGame(names, card_types, seed, **game_args)
+
+
+def playScheduled(strategy_names, card_types, scheduled, balanced=False,
+                  **game_args):
+    return renumberResult(playScheduledGame(strategy_names, card_types,
+        scheduled, balanced, **game_args), scheduled)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def startPool(jobs):
+    # pool of <jobs> worker processes playing games, None for one job
+    if jobs <= 1:
+        return None
+    return multiprocessing.Pool(jobs, initializer=loadStrategies)
+
+
+def playGames(strategy_names, card_types, games, jobs=1, chunksize=16,
+              record=False, balanced=False, cache=None, accounting=False,
+              pool=None, **game_args):
+    # Plays <games> from schedule(). Results of games found in <cache>
+    # (core.cache.ResultCache) are taken from it, new ones are put there;
+    # games with <record> are always played. Games are played by given
+    # <pool> of startPool(), otherwise by own pool of <jobs> processes.
+    strategy_names = list(strategy_names)
+    card_types = list(card_types)
+    own_pool = None
+    if pool is None:
+        pool = own_pool = startPool(jobs)
+    try:
+        if cache is None or record:
+            play = functools.partial(playScheduled, strategy_names,
+                card_types, balanced=balanced, record=record,
+                accounting=accounting, **game_args)
+            if pool is None:
+                played = map(play, games)
+            else:
+                played = pool.imap(play, games, chunksize)
+            for result in played:
+                yield result
+            return
+        play = functools.partial(playScheduledGame, strategy_names,
+            card_types, balanced=balanced, accounting=accounting,
+            **game_args)
+        strategies = loadStrategies()
+        for chunk in chunks(games, max(256, 4 * jobs * chunksize)):
+            keys = []
+            for scheduled in chunk:
+                names, seed, args = scheduledGame(strategy_names, scheduled,
+                    balanced, **game_args)
+                keys.append(core.cache.gameKey(
+                    [(name, strategies[name]) for name in names],
+                    card_types, seed, args))
+            known = cache.get(keys)
+            missing = [scheduled for scheduled, key in zip(chunk, keys)
+                       if key not in known]
+            if pool is None:
+                played = map(play, missing)
+            else:
+                played = pool.imap(play, missing, chunksize)
+            new = []
+            try:
+                for scheduled, key in zip(chunk, keys):
+                    if key in known:
+                        result = known[key]
+                    else:
+                        result = next(played)
+                        new.append((key, result))
+                    yield renumberResult(result, scheduled)
+            finally:
+                # games played before consumer stopped (e.g. ranking is
+                # settled or run is interrupted) are cached too
+                cache.put(new)
+    finally:
+        if own_pool is not None:
+            own_pool.terminate()
+
+
+class Progress(object):
+    # Throughput of played games (games and turns per second, ETA), turns
+    # per seat in order of turns and CPU time of turns of every player.
+    # Games recovered from output of interrupted run count in turns per
+    # seat and player, but not in throughput.
+    def __init__(self, total_games, nplayers):
+        self.start = time.time()
+        self.total_games = total_games
+        self.games = 0
+        self.turns = 0
+        self.recovered = 0
+        self.seat_games = [0] * nplayers
+        self.seat_turns = [0] * nplayers
+        self.player_turns = [0] * nplayers
+        # only turns of played (e.g. not cached) games are timed
+        self.player_cpu = [0.0] * nplayers
+        self.player_timed_turns = [0] * nplayers
+    
+    def add(self, result):
+        table = result["table"]
+        self.games += 1
+        self.turns += self.addTurns(result)
+        for nplayer, seconds in result.get("cpu", {}).items():
+            self.player_cpu[nplayer-1] += seconds
+            self.player_timed_turns[nplayer-1] += table[nplayer][1]
+    
+    def addRecovered(self, record):
+        # <record> is game read by recoverResults()
+        self.recovered += 1
+        self.addTurns(record)
+    
+    def addTurns(self, result):
+        table = result["table"]
+        total = 0
+        for seat, nplayer in enumerate(result["seats"]):
+            turns = table[nplayer][1]
+            total += turns
+            self.seat_games[seat] += 1
+            self.seat_turns[seat] += turns
+            self.player_turns[nplayer-1] += turns
+        return total
+    
+    def elapsed(self):
+        return max(1e-9, time.time() - self.start)
+    
+    def status(self):
+        elapsed = self.elapsed()
+        rate = self.games / elapsed
+        eta = (self.total_games - self.games) / max(1e-9, rate)
+        return "{:.1f} games/s, {:.0f} turns/s, ETA {:.0f}s".format(rate,
+            self.turns / elapsed, eta)
+    
+    def seatTurns(self, seat):
+        return float(self.seat_turns[seat]) / max(1, self.seat_games[seat])
+    
+    def cpuPerTurn(self, nplayer):
+        return (self.player_cpu[nplayer-1] /
+                max(1, self.player_timed_turns[nplayer-1]))
+
+
+class RankingTest(object):
+    # Sequential test of ranking of players by number of wins. Every pair
+    # of players neighbouring in ranking is compared by per-game difference
+    # of their wins; ranking is settled when all differences are
+    # significant. Significance level is split (Bonferroni) between pairs
+    # and between all <max_checks> checks, so repeated checking of the
+    # same tournament keeps error rate below 1 - <confidence>.
+    def __init__(self, nplayers, confidence, max_checks):
+        self.nplayers = nplayers
+        self.alpha = (1.0 - confidence) / max(1, nplayers - 1) / max(1, max_checks)
+        self.games = 0
+        self.wins = [0] * nplayers
+        # sums of differences of wins and of their squares, by pair
+        self.diffs = [[0] * nplayers for _ in range(nplayers)]
+        self.squares = [[0] * nplayers for _ in range(nplayers)]
+    
+    def add(self, table):
+        wins = [int(table[nplayer][4]) for nplayer in range(1, self.nplayers+1)]
+        self.games += 1
+        for i in range(self.nplayers):
+            self.wins[i] += wins[i]
+            for j in range(self.nplayers):
+                diff = wins[i] - wins[j]
+                self.diffs[i][j] += diff
+                self.squares[i][j] += diff * diff
+    
+    def pValue(self, i, j):
+        # two-sided p-value of equal win rates of players <i> and <j>;
+        # differences of wins are -1, 0 or 1, so sum of their squares is
+        # number of games won by only one of them. Few such games are
+        # tested by exact sign test, normal approximation is not valid for
+        # them (e.g. it gives 0 when all of them are won by the same one).
+        nonzero = self.squares[i][j]
+        if nonzero <= SIGN_TEST_GAMES:
+            wins = (nonzero + abs(self.diffs[i][j])) // 2
+            tail = sum(math.comb(nonzero, k) for k in range(wins, nonzero+1))
+            return min(1.0, 2.0 * tail / 2 ** nonzero)
+        n = self.games
+        mean = float(self.diffs[i][j]) / n
+        variance = (self.squares[i][j] - n * mean * mean) / (n - 1)
+        if variance <= 0:
+            return 0.0 if mean != 0 else 1.0
+        z = abs(mean) / math.sqrt(variance / n)
+        return math.erfc(z / math.sqrt(2))
+    
+    def ranking(self):
+        return sorted(range(self.nplayers), key=lambda i: self.wins[i],
+            reverse=True)
+    
+    def settled(self):
+        ranking = self.ranking()
+        return all(self.pValue(i, j) < self.alpha
+                   for i, j in zip(ranking, ranking[1:]))
+
+
+class ResultsWriter(object):
+    # Appends one JSON line per game to file, lines are written and
+    # flushed in batches of <batch> games.
+    def __init__(self, path, strategy_names, batch=100, append=False):
+        self.file = open(path, "a" if append else "w")
+        self.strategy_names = list(strategy_names)
+        self.batch = batch
+        self.lines = []
+    
+    def write(self, ngame, result):
+        record = {
+            "game": ngame,
+            "seed": result["seed"],
+            "strategies": self.strategy_names,
+            "players": result["players"],
+            "kingdom": result["kingdom"],
+            "seats": result["seats"],
+            "table": result["table"],
+        }
+        self.lines.append(json.dumps(record) + "\n")
+        if len(self.lines) >= self.batch:
+            self.flush()
+    
+    def flush(self):
+        self.file.write("".join(self.lines))
+        self.file.flush()
+        self.lines = []
+    
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def recoverResults(path):
+    # Reads games written by ResultsWriter. Incomplete last line (left by
+    # interrupted run) is cut off the file, so it can be appended.
+    records = []
+    if not os.path.exists(path):
+        return records
+    size = 0
+    with open(path, "rb") as results:
+        for line in results:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except ValueError:
+                break
+            record["table"] = dict((int(nplayer), tuple(row))
+                                   for nplayer, row in record["table"].items())
+            records.append(record)
+            size += len(line)
+    if size < os.path.getsize(path):
+        with open(path, "r+b") as results:
+            results.truncate(size)
+    return records
+
+
+class PairwiseMatrix(object):
+    # For every pair of strategies counts games they played together and
+    # how often the first one ranked above the second (ties count half).
+    def __init__(self, nplayers):
+        self.games = [[0] * nplayers for _ in range(nplayers)]
+        self.beats = [[0.0] * nplayers for _ in range(nplayers)]
+    
+    def add(self, table):
+        for i, row_i in table.items():
+            for j, row_j in table.items():
+                if i == j:
+                    continue
+                # by scores, then by less turns, like Game.scoreTable()
+                score_i, score_j = (row_i[0], -row_i[1]), (row_j[0], -row_j[1])
+                self.games[i-1][j-1] += 1
+                if score_i > score_j:
+                    self.beats[i-1][j-1] += 1
+                elif score_i == score_j:
+                    self.beats[i-1][j-1] += 0.5
+    
+    def rate(self, i, j):
+        if self.games[i][j] == 0:
+            return None
+        return self.beats[i][j] / self.games[i][j]
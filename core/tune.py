@@ -0,0 +1,277 @@
+import functools
+import math
+import multiprocessing
+import random
+
+import core.tournament
+
+
+def tunableParameters(strategy_cls, names=None):
+    # (name, value) of numeric class constants of strategy (with inherited
+    # ones), by default only float ones: integer constants are rather
+    # counts and budgets than thresholds
+    checkStrategyClass(strategy_cls)
+    params = []
+    for name in sorted(dir(strategy_cls)):
+        value = getattr(strategy_cls, name)
+        if name.startswith('_') or isinstance(value, bool):
+            continue
+        if names is None:
+            if isinstance(value, float):
+                params.append((name, value))
+        elif name in names:
+            if not isinstance(value, (int, float)):
+                raise ValueError("{} is not numeric".format(name))
+            params.append((name, value))
+    if names is not None and len(params) < len(names):
+        missing = set(names) - set(name for name, value in params)
+        raise ValueError("No such parameters: {}".format(
+            ", ".join(sorted(missing))))
+    return params
+
+
+def checkStrategyClass(strategy_cls):
+    # strategies registered as instances (e.g. *.Random ones picking one of
+    # candidate strategies) have no class constants to subclass
+    if not isinstance(strategy_cls, type):
+        raise ValueError("{} is not a strategy class, tune one of "
+            "strategies it picks".format(strategy_cls.__name__))
+
+
+def parameterBounds(value):
+    # thresholds in [0, 1] (e.g. shares of provinces left) stay there,
+    # other non-negative parameters stay non-negative
+    if isinstance(value, float) and 0.0 <= value <= 1.0:
+        return 0.0, 1.0
+    if value >= 0:
+        return 0.0, None
+    return None, None
+
+
+class SepCMAES(object):
+    # Separable CMA-ES (Ros & Hansen, 2008): covariance of search
+    # distribution is diagonal, so it needs no linear algebra and update
+    # is O(n) per candidate. Maximizes fitness; candidates are kept in
+    # [<lower>, <upper>] bounds (None is unbounded) by clipping.
+    def __init__(self, mean, sigma, lower, upper, popsize=None, seed=None):
+        n = len(mean)
+        self.n = n
+        self.mean = list(mean)
+        self.sigma = sigma
+        self.lower = lower
+        self.upper = upper
+        self.random = random.Random(seed)
+        self.popsize = popsize or 4 + int(3 * math.log(n))
+        self.mu = self.popsize // 2
+        weights = [math.log(self.mu + 0.5) - math.log(i + 1)
+                   for i in range(self.mu)]
+        self.weights = [w / sum(weights) for w in weights]
+        self.mueff = 1.0 / sum(w * w for w in self.weights)
+        mueff = self.mueff
+        self.cc = (4.0 + mueff / n) / (n + 4.0 + 2.0 * mueff / n)
+        self.cs = (mueff + 2.0) / (n + mueff + 5.0)
+        c1 = 2.0 / ((n + 1.3) ** 2 + mueff)
+        cmu = 2.0 * (mueff - 2.0 + 1.0 / mueff) / ((n + 2.0) ** 2 + mueff)
+        # diagonal learns faster than full covariance
+        self.c1 = min(1.0, c1 * (n + 2.0) / 3.0)
+        self.cmu = min(1.0 - self.c1, cmu * (n + 2.0) / 3.0)
+        self.damps = 1.0 + self.cs + 2.0 * max(0.0,
+            math.sqrt((mueff - 1.0) / (n + 1.0)) - 1.0)
+        self.chin = math.sqrt(n) * (1.0 - 1.0 / (4.0 * n) +
+            1.0 / (21.0 * n * n))
+        self.variances = [1.0] * n
+        self.pc = [0.0] * n
+        self.ps = [0.0] * n
+        self.generation = 0
+        self.steps = []
+    
+    def clip(self, x):
+        ret = []
+        for v, lo, hi in zip(x, self.lower, self.upper):
+            if lo is not None:
+                v = max(lo, v)
+            if hi is not None:
+                v = min(hi, v)
+            ret.append(v)
+        return ret
+    
+    def ask(self):
+        # new population, every candidate clipped to bounds
+        self.steps = []
+        population = []
+        for _ in range(self.popsize):
+            z = [self.random.gauss(0.0, 1.0) for _ in range(self.n)]
+            self.steps.append(z)
+            population.append(self.clip([m + self.sigma * math.sqrt(c) * zi
+                for m, c, zi in zip(self.mean, self.variances, z)]))
+        return population
+    
+    def tell(self, fitnesses):
+        # fitnesses of population of last ask() in the same order
+        n, cs, cc = self.n, self.cs, self.cc
+        order = sorted(range(self.popsize), key=lambda i: fitnesses[i],
+            reverse=True)
+        zw = [sum(w * self.steps[i][k] for w, i in zip(self.weights, order))
+              for k in range(n)]
+        yw = [math.sqrt(c) * z for c, z in zip(self.variances, zw)]
+        self.mean = self.clip([m + self.sigma * y
+                               for m, y in zip(self.mean, yw)])
+        self.generation += 1
+        scale = math.sqrt(cs * (2.0 - cs) * self.mueff)
+        self.ps = [(1.0 - cs) * p + scale * z for p, z in zip(self.ps, zw)]
+        norm = math.sqrt(sum(p * p for p in self.ps))
+        hsig = (norm / math.sqrt(1.0 - (1.0 - cs) ** (2 * self.generation))
+                / self.chin < 1.4 + 2.0 / (n + 1.0))
+        scale = math.sqrt(cc * (2.0 - cc) * self.mueff)
+        self.pc = [(1.0 - cc) * p + hsig * scale * y
+                   for p, y in zip(self.pc, yw)]
+        variances = []
+        for k, c in enumerate(self.variances):
+            rank_mu = sum(w * c * self.steps[i][k] ** 2
+                          for w, i in zip(self.weights, order))
+            variances.append((1.0 - self.c1 - self.cmu) * c +
+                self.c1 * (self.pc[k] ** 2 +
+                           (1 - hsig) * cc * (2.0 - cc) * c) +
+                self.cmu * rank_mu)
+        self.variances = variances
+        self.sigma *= math.exp(cs / self.damps * (norm / self.chin - 1.0))
+
+
+def candidateName(strategy_name, ncandidate):
+    return "{}#tuned{}".format(strategy_name, ncandidate)
+
+
+def registerCandidate(strategy_name, ncandidate, params):
+    # candidates are subclasses built in every process from their
+    # parameters, so only parameters are sent to workers
+    strategies = core.tournament.loadStrategies()
+    name = candidateName(strategy_name, ncandidate)
+    base = strategies[strategy_name]
+    checkStrategyClass(base)
+    strategies[name] = type(base.__name__, (base,), dict(params))
+    return name
+
+
+def playCandidate(strategy_name, opponents, job, **game_args):
+    # win (1 or 0) of candidate playing against <opponents> in given kingdom
+    # and scheduled game; candidate is strategy 1
+    ncandidate, params, card_types, scheduled = job
+    name = registerCandidate(strategy_name, ncandidate, params)
+    # games are not reused, as the same name is given to other candidates
+    # in every generation
+    result = core.tournament.playScheduled([name] + list(opponents),
+        card_types, scheduled, balanced=True, reuse=False, **game_args)
+    return ncandidate, int(result["table"][1][4])
+
+
+class Tuner(object):
+    # Tunes numeric class constants of strategy <strategy_name> against
+    # <opponents> by SepCMAES. Every candidate of generation plays the same
+    # games: every kingdom of <kingdoms>, <ngames> seeds in all rotations
+    # of seats with common random numbers, so candidates differ by their
+    # parameters rather than by luck of their shuffles; seeds of next
+    # generation are new, so parameters don't fit particular seeds.
+    # Fitness is the rate of games won. Games of generation are spread
+    # over pool of <jobs> processes.
+    def __init__(self, strategy_name, opponents, kingdoms, ngames=10,
+                 names=None, sigma=0.2, popsize=None, seed=0, jobs=1,
+                 **game_args):
+        self.strategy_name = strategy_name
+        self.strategy_cls = core.tournament.loadStrategies()[strategy_name]
+        self.opponents = list(opponents)
+        self.kingdoms = [[card_type.name() for card_type in kingdom]
+                         for kingdom in kingdoms]
+        self.ngames = ngames
+        self.seed = seed
+        self.jobs = jobs
+        self.game_args = game_args
+        self.params = tunableParameters(self.strategy_cls, names)
+        if len(self.params) == 0:
+            raise ValueError("{} has no parameters to tune".format(
+                strategy_name))
+        self.names = [name for name, value in self.params]
+        self.initial = [value for name, value in self.params]
+        # search is made in units of parameters, i.e. in 1 for thresholds
+        self.scales = [max(1.0, abs(value)) for value in self.initial]
+        bounds = [parameterBounds(value) for value in self.initial]
+        self.es = SepCMAES([value / scale for value, scale
+                            in zip(self.initial, self.scales)], sigma,
+            [None if lo is None else lo / scale
+             for (lo, hi), scale in zip(bounds, self.scales)],
+            [None if hi is None else hi / scale
+             for (lo, hi), scale in zip(bounds, self.scales)],
+            popsize, seed)
+    
+    def values(self, x):
+        # parameters of candidate, integers stay integers
+        ret = []
+        for v, scale, initial in zip(x, self.scales, self.initial):
+            v *= scale
+            ret.append(int(round(v)) if isinstance(initial, int) else v)
+        return ret
+    
+    def games(self, generation):
+        seeds = core.tournament.gameSeeds(self.seed +
+            generation * self.ngames, self.ngames)
+        return list(core.tournament.schedule(1 + len(self.opponents), seeds,
+            rotate=True))
+    
+    def evaluate(self, candidates, generation, pool=None):
+        # rates of games won by every candidate (list of parameter values)
+        games = self.games(generation)
+        jobs = [(ncandidate, list(zip(self.names, values)), card_types,
+                 scheduled)
+                for ncandidate, values in enumerate(candidates)
+                for card_types in self.kingdoms for scheduled in games]
+        play = functools.partial(playCandidate, self.strategy_name,
+            self.opponents, **self.game_args)
+        if pool is None:
+            played = map(play, jobs)
+        else:
+            played = pool.imap_unordered(play, jobs, 4)
+        wins = [0] * len(candidates)
+        for ncandidate, win in played:
+            wins[ncandidate] += win
+        total = len(self.kingdoms) * len(games)
+        return [float(win) / total for win in wins]
+    
+    def run(self, generations, report=None):
+        # tuned parameter values (mean of search distribution); after every
+        # generation <report> is called with generation number, sigma,
+        # fitness of best candidate, of mean (the one generation started
+        # from) and of initial parameters and new mean
+        pool = None
+        if self.jobs > 1:
+            pool = multiprocessing.Pool(self.jobs,
+                initializer=core.tournament.loadStrategies)
+        try:
+            for generation in range(generations):
+                population = [self.values(x) for x in self.es.ask()]
+                mean = self.values(self.es.mean)
+                # mean and initial parameters play the same games, so
+                # progress is seen through noise of single generation
+                fitnesses = self.evaluate(population + [mean, self.initial],
+                    generation, pool)
+                self.es.tell(fitnesses[:-2])
+                if report is not None:
+                    report(generation + 1, self.es.sigma,
+                        max(fitnesses[:-2]), fitnesses[-2], fitnesses[-1],
+                        self.values(self.es.mean))
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return self.values(self.es.mean)
+    
+    def subclassSource(self, values, class_name=None):
+        # source of subclass of tuned strategy with given parameter values
+        base = self.strategy_cls
+        module = base.__module__.split('.')[-1]
+        if class_name is None:
+            class_name = "Tuned" + base.__name__
+        lines = ["class {}({}.{}):".format(class_name, module, base.__name__)]
+        for name, value in zip(self.names, values):
+            if isinstance(value, float):
+                value = round(value, 4)
+            lines.append("    {} = {!r}".format(name, value))
+        return "\n".join(lines) + "\n"
+
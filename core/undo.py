@@ -0,0 +1,127 @@
+from core.engine import PiledZone
+
+
+class UndoJournal(object):
+    # Watcher (see Game.watch()) journaling card movements after mark(), so
+    # game can be rolled back to any marker, e.g. by lookahead trying moves
+    # on single game instead of its clones:
+    #
+    #   marker = journal.mark()
+    #   for move in game.legalMoves():
+    #       game.doMove(move)
+    #       ...
+    #       journal.rollback(marker)
+    #   journal.release(marker)
+    #
+    # Card movements are undone by reverse zone operations, so other
+    # watchers see them as usual moves. Counters of players and game and
+    # state of random generators are saved by mark() itself. State of
+    # strategies and of listeners is not restored.
+    def __init__(self):
+        self.game = None
+        self.entries = []
+        # (number of entries, saved state) of every marker
+        self.markers = []
+        self.rolling_back = False
+    
+    def attach(self, game):
+        self.game = game
+        game.watch(self)
+    
+    def detach(self, game):
+        game.unwatch(self)
+        self.game = None
+        self.entries = []
+        self.markers = []
+    
+    def mark(self):
+        game = self.game
+        randoms = [game.random]
+        players = []
+        for player in game.players:
+            if player.random is not game.random:
+                randoms.append(player.random)
+            players.append((player, player.money, player.actions,
+                player.buys, player.actions_played, player.turns_taken))
+        state = (game.active_player, game.phase, game.cost_modifier, players,
+                 [(rng, rng.getstate()) for rng in randoms])
+        self.markers.append((len(self.entries), state))
+        return len(self.markers) - 1
+    
+    def rollback(self, marker):
+        # to state of game at given marker, markers set later are released
+        nentries, state = self.markers[marker]
+        del self.markers[marker+1:]
+        entries = self.entries
+        self.rolling_back = True
+        try:
+            while len(entries) > nentries:
+                entry = entries.pop()
+                entry[0](*entry[1:])
+        finally:
+            self.rolling_back = False
+        game = self.game
+        game.active_player, game.phase, game.cost_modifier, players, \
+            randoms = state
+        for player, money, actions, buys, actions_played, turns_taken \
+                in players:
+            player.money, player.actions, player.buys = money, actions, buys
+            player.actions_played = actions_played
+            player.turns_taken = turns_taken
+        for rng, rng_state in randoms:
+            rng.setstate(rng_state)
+    
+    def release(self, marker):
+        # keeps current state of game, forgets given marker and later ones
+        del self.markers[marker:]
+        if len(self.markers) == 0:
+            del self.entries[:]
+    
+    def zonePick(self, zone, card, index):
+        if self.markers and not self.rolling_back:
+            self.entries.append((self.undoPick, zone, card, index))
+    
+    def zonePut(self, zone, card, index):
+        if self.markers and not self.rolling_back:
+            self.entries.append((self.undoPut, zone, card))
+    
+    def zoneMoveAll(self, src, dst, moved):
+        if self.markers and not self.rolling_back:
+            self.entries.append((self.undoMoveAll, src, dst, list(moved)))
+    
+    def zoneShuffle(self, zone, previous):
+        if self.markers and not self.rolling_back:
+            self.entries.append((self.undoShuffle, zone, previous))
+    
+    def unpicked(self, zone, card_type):
+        # undo operations pick cards as well, but zone has to count only
+        # cards picked by the game itself
+        zone.picked[card_type] -= 1
+    
+    def undoPick(self, zone, card, index):
+        if zone.__class__ is PiledZone:
+            zone.putCard(card)
+        elif index is None:
+            zone.put(card)
+        else:
+            zone.insert(card, index)
+        self.unpicked(zone, card.__class__)
+    
+    def undoPut(self, zone, card):
+        zone.pick(card)
+        self.unpicked(zone, card.__class__)
+    
+    def undoMoveAll(self, src, dst, moved):
+        # moved cards are the last ones in destination zone
+        dst.takeLast(moved)
+        src.putAll(moved)
+        for card in moved:
+            self.unpicked(src, card.__class__)
+        for watcher in src.watchers:
+            watcher.zoneMoveAll(dst, src, moved)
+    
+    def undoShuffle(self, zone, previous):
+        current = list(zone.cards)
+        zone.cards[:] = previous
+        for watcher in zone.watchers:
+            watcher.zoneShuffle(zone, current)
@@ -0,0 +1,150 @@
+import core.cards as cards
+import core.rules as rules
+
+
+MASK = (1 << 64) - 1
+
+# keys of counts of cards of every type in every zone, by
+# (zone_id * len(CARD_TYPES) + type_id) * MAX_COUNT + count; other
+# parts of state use keys above them
+MAX_COUNT = 1 << 10
+ACTIVE_KEYS = 1 << 40
+PHASE_KEYS = 2 << 40
+COUNTER_KEYS = 3 << 40
+
+KEYS = {}
+
+
+def mix64(value):
+    # splitmix64, so keys are the same in every process
+    value = (value + 0x9E3779B97F4A7C15) & MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK
+    return value ^ (value >> 31)
+
+
+def key(code):
+    ret = KEYS.get(code)
+    if ret is None:
+        ret = KEYS[code] = mix64(code)
+    return ret
+
+
+class StateHash(object):
+    # Watcher and listener (see Game.watch() and Game.listen()) keeping
+    # Zobrist hash of numbers of cards of every type in supply, trash and
+    # zones of every player (order of deck is not hashed) up to date with
+    # every card movement. value() adds active player, phase and counters
+    # of current turn, so it is O(1). Works with core.undo.UndoJournal, as
+    # rollback is made of usual card movements.
+    def __init__(self):
+        self.game = None
+        self.hash = 0
+        self.counts = []
+    
+    def attach(self, game):
+        game.listen(self)
+        game.watch(self)
+        self.onNewGame(game)
+    
+    def detach(self, game):
+        game.unlisten(self)
+        game.unwatch(self)
+        self.game = None
+    
+    def onNewGame(self, game):
+        self.game = game
+        self.hash = 0
+        ntypes = len(cards.CARD_TYPES)
+        zones = game.zones()
+        self.counts = [0] * (ntypes * len(zones))
+        for zone in zones:
+            for card_type, pile in zone.piles.items():
+                self.add(zone.zone_id * ntypes + card_type.type_id, len(pile))
+    
+    def add(self, pile, delta):
+        # <pile> is zone_id * len(CARD_TYPES) + type_id
+        count = self.counts[pile]
+        code = pile * MAX_COUNT
+        if count > 0:
+            self.hash ^= key(code + count)
+        count += delta
+        if count > 0:
+            self.hash ^= key(code + count)
+        self.counts[pile] = count
+    
+    def value(self):
+        game = self.game
+        player = game.players[game.active_player]
+        ret = self.hash ^ key(ACTIVE_KEYS + game.active_player)
+        if game.phase is not None:
+            ret ^= key(PHASE_KEYS + rules.TURN_PHASES.index(game.phase))
+        counters = (player.actions, player.buys, player.money,
+            game.cost_modifier)
+        for n, counter in enumerate(counters):
+            ret ^= key(COUNTER_KEYS + (n << 16) + (counter & 0xffff))
+        return ret
+    
+    def zonePick(self, zone, card, index):
+        self.add(zone.zone_id * len(cards.CARD_TYPES) + card.type_id, -1)
+    
+    def zonePut(self, zone, card, index):
+        self.add(zone.zone_id * len(cards.CARD_TYPES) + card.type_id, 1)
+    
+    def zoneMoveAll(self, src, dst, moved):
+        ntypes = len(cards.CARD_TYPES)
+        counts = {}
+        for card in moved:
+            counts[card.type_id] = counts.get(card.type_id, 0) + 1
+        for type_id, count in counts.items():
+            self.add(src.zone_id * ntypes + type_id, -count)
+            self.add(dst.zone_id * ntypes + type_id, count)
+    
+    def zoneShuffle(self, zone, previous):
+        pass
+
+
+class TranspositionTable(object):
+    # Values of states by hash (see StateHash.value()) in <size> slots.
+    # Colliding state replaces stored one if that one was stored during
+    # previous search (see newSearch()) or was not searched deeper, so
+    # memory is bounded and valuable entries survive.
+    def __init__(self, size=1 << 16):
+        self.size = size
+        self.hashes = [None] * size
+        self.depths = [0] * size
+        self.ages = [0] * size
+        self.values = [None] * size
+        self.age = 0
+        self.hits = self.misses = 0
+    
+    def newSearch(self):
+        self.age += 1
+    
+    def get(self, state_hash, depth=0):
+        # value of state searched at least to <depth> or None
+        slot = state_hash % self.size
+        if self.hashes[slot] == state_hash and self.depths[slot] >= depth:
+            self.hits += 1
+            self.ages[slot] = self.age
+            return self.values[slot]
+        self.misses += 1
+        return None
+    
+    def put(self, state_hash, value, depth=0):
+        slot = state_hash % self.size
+        if (self.hashes[slot] is not None and
+                self.hashes[slot] != state_hash and
+                self.ages[slot] == self.age and
+                self.depths[slot] > depth):
+            return False
+        self.hashes[slot] = state_hash
+        self.depths[slot] = depth
+        self.ages[slot] = self.age
+        self.values[slot] = value
+        return True
+    
+    def clear(self):
+        self.hashes = [None] * self.size
+        self.values = [None] * self.size
+        self.hits = self.misses = 0
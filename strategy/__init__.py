@@ -1,7 +1,6 @@
 import pkgutil
 import inspect
-
-import random
+import sys
 
 import core.rules
 
@@ -10,17 +9,27 @@ class RandomStrategy(object):
     def __init__(self, modname, candidates):
         self.candidates = candidates
         setattr(self, '__name__', '{}.Random'.format(modname))
-    def __call__(self, *args, **kwargs):
-        i = random.randrange(0, len(self.candidates))
+    def __call__(self, game, *args, **kwargs):
+        i = game.random.randrange(0, len(self.candidates))
         name, cls = self.candidates[i]
-        return cls(*args, **kwargs)
+        return cls(game, *args, **kwargs)
 
 
 strategies = {}
 
 for importer, name, ispkg in pkgutil.iter_modules(__path__):
-    loader = importer.find_module(name)
-    module = loader.load_module(name)
+    # modules are loaded as top level ones (e.g. demo) and the same module
+    # objects are strategy.<name>, so "from strategy import demo" in other
+    # modules gives classes of the registry rather than their copies
+    submodule_name = "{}.{}".format(__name__, name)
+    module = sys.modules.get(submodule_name)
+    if module is None:
+        loader = importer.find_module(name)
+        module = loader.load_module(name)
+        sys.modules[submodule_name] = module
+    else:
+        sys.modules[name] = module
+    globals()[name] = module
     mod_strategies = []
     for varname in dir(module):
         cls = getattr(module, varname)
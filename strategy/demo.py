@@ -1,8 +1,9 @@
 from core.engine import cardType
 
 import core.cards
+import core.rules
 from core.cards import Treasure, Victory, Action, Attack, Reaction, \
-    Curse, Copper, Silver, Gold, Estate, Duchy, Province
+    Curse, Copper, Silver, Gold, Estate, Duchy, Province, TREASURE
 
 
 class Basic(object):
@@ -21,9 +22,9 @@ class Basic(object):
         return float(rest) / float(max(1, rest + picked))
     def _canpay(self):
         ret = self.player.money
-        for card in self.player.hand.cards:
-            if card.hasType(Treasure):
-                ret += card.money
+        for card_type, pile in self.player.hand.piles.items():
+            if card_type.type_mask & TREASURE:
+                ret += card_type.money * len(pile)
         return ret
     def _canbuy(self, card):
         card = cardType(card)
@@ -33,8 +34,11 @@ class Basic(object):
     def _deckp(self, *cards):
         total = sum([self.player.countCards(c) for c in cards])
         return float(self.player.count()) / float(max(1, total))
+    def _lastPiles(self):
+        # game may end by empty piles at any next turn
+        return self.game.emptyPilesCount() >= core.rules.MAX_EMPTY_PILES - 1
     def _playAllTreasures(self):
-        treasures = [c for c in self.player.hand.cards if c.hasType(Treasure)]
+        treasures = [c for c in self.player.hand.cards if c.type_mask & TREASURE]
         for card in treasures:
             self.player.play(card)
     
@@ -114,7 +118,7 @@ class Basic(object):
         ))
         return candidates[0]
     def trashForMasquerade(self):
-        if Curse in self.player.hand:
+        if self.player.hand.countCards(Curse) > 0:
             return Curse
     def putForCourtyard(self):
         candidates = self.player.hand.cards[:]
@@ -129,9 +133,9 @@ class Basic(object):
             src = self.player.discard
         if src.count() == 0:
             return Curse
-        candidates = [(len(p), c) for (c, p) in src.piles.items()]
+        candidates = [(len(p), c.type_id, c) for (c, p) in src.piles.items()]
         candidates.sort()
-        return candidates[-1][1]
+        return candidates[-1][2]
     def gainForSaboteur(self, cost):
         for card in (Province, Gold, Silver, Duchy):
             if self.game.supply.countCards(card) > 0 and self.game.currentCost(card) <= cost:
@@ -177,15 +181,19 @@ class Basic(object):
 class BigMoney(Basic):
     max_provinces_for_duchy = 8.0 / 12.0
     max_provinces_for_estate = 2.0 / 12.0
+    def _wantDuchy(self):
+        return self._restp("province") <= self.max_provinces_for_duchy
+    def _wantEstate(self):
+        return self._restp("province") <= self.max_provinces_for_estate
     def action(self):
         pass
     def buy(self):
         self._playAllTreasures()
         if self._canbuy("province"):
             self.player.buy("province")
-        elif self._canbuy("duchy") and self._restp("province") <= self.max_provinces_for_duchy:
+        elif self._canbuy("duchy") and self._wantDuchy():
             self.player.buy("duchy")
-        elif self._canbuy("estate") and self._restp("province") <= self.max_provinces_for_estate:
+        elif self._canbuy("estate") and self._wantEstate():
             self.player.buy("estate")
         elif self._canbuy("gold"):
             self.player.buy("gold")
@@ -193,6 +201,14 @@ class BigMoney(Basic):
             self.player.buy("silver")
 
 
+class EndgameBigMoney(BigMoney):
+    # starts greening also when game is one pile away from ending on piles
+    def _wantDuchy(self):
+        return self._lastPiles() or BigMoney._wantDuchy(self)
+    def _wantEstate(self):
+        return self._lastPiles() or BigMoney._wantEstate(self)
+
+
 class Discarder(BigMoney):
     max_provinces_for_duchy = 5.0 / 12.0
     max_provinces_for_estate = 0.0 / 12.0
@@ -202,7 +218,7 @@ class Discarder(BigMoney):
             total_money = 0
             for z in self.player.zones:
                 for c, p in z.piles.items():
-                    if c.hasType(Treasure):
+                    if c.type_mask & TREASURE:
                         total_money += c.money*len(p)
             max_copper_to_trash = max(0, total_money - 3)
             max_silver_to_trash = max(0, total_money - 6) // 2
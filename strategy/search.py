@@ -0,0 +1,195 @@
+import atexit
+import math
+import multiprocessing
+import random
+import time
+
+from core.cards import Curse, Copper, ThroneRoom, Treasure
+
+from strategy import demo
+
+
+# process pools of parallel searches by number of jobs
+POOLS = {}
+
+# lead in scores giving the whole reward of margin
+MAX_LEAD = 30
+
+
+def rollout(game, nplayer, card_type, policy, horizon, margin, seed):
+    # reward of player <nplayer> buying <card_type> (or nothing) in buy
+    # phase of <game>, when all players are then played by <policy> till
+    # the end of game or for <horizon> turns: share of victory mixed with
+    # lead in scores by weight <margin>, as victory alone is too rare a
+    # signal when player is behind
+    sim = game.clone(policy, seed=seed)
+    # order of decks is unknown to player, so it is guessed at random
+    for player in sim.players:
+        player.deck.shuffle()
+    player = sim.activePlayer()
+    if card_type is not None:
+        player.buy(card_type)
+    # the rest of buys is made by policy
+    if card_type is not None and player.buys > 0:
+        over = sim.finishTurn(["buy", "cleanup"])
+    else:
+        over = sim.finishTurn(["cleanup"])
+    turns = 0
+    while not over and turns < horizon:
+        over = sim.turn()
+        turns += 1
+    table = sim.scoreTable()
+    win = 0.0
+    if table[nplayer][4]:
+        win = 1.0 / sum(1 for row in table.values() if row[4])
+    lead = table[nplayer][0] - max(row[0] for n, row in table.items()
+                                   if n != nplayer)
+    lead = max(-1.0, min(1.0, lead / float(MAX_LEAD)))
+    return (1.0 - margin) * win + margin * (0.5 + 0.5 * lead)
+
+
+def searchBuys(game, nplayer, arms, policy, rollouts, deadline, horizon,
+               margin, exploration, seed):
+    # UCB1 over buys of <arms> with at most <rollouts> rollouts or till
+    # <deadline>, returns number of rollouts and total reward of every arm;
+    # n-th rollouts of all arms get the same shuffles, so arms are compared
+    # on equal terms
+    rng = random.Random(seed)
+    seeds = []
+    visits = [0] * len(arms)
+    rewards = [0.0] * len(arms)
+    for n in range(rollouts):
+        if n < len(arms):
+            arm = n
+        else:
+            if deadline is not None and time.time() > deadline:
+                break
+            log_n = math.log(n)
+            arm = max(range(len(arms)), key=lambda i:
+                rewards[i] / visits[i] +
+                exploration * math.sqrt(log_n / visits[i]))
+        if visits[arm] == len(seeds):
+            seeds.append(rng.getrandbits(32))
+        rewards[arm] += rollout(game, nplayer, arms[arm], policy, horizon,
+            margin, seeds[visits[arm]])
+        visits[arm] += 1
+    return visits, rewards
+
+
+def playEffects(move):
+    # (actions, cards drawn, money) given by play move, card doubled by
+    # throne room gives them twice
+    card_type, targets = move[1], move[2]
+    times = 1
+    if card_type is ThroneRoom:
+        card_type, times = targets[0], 2
+    return (times * card_type.actions, times * card_type.draw_cards,
+            times * card_type.money)
+
+
+def searchPool(jobs):
+    # daemonic processes (e.g. tournament workers) can't have children
+    if jobs <= 1 or multiprocessing.current_process().daemon:
+        return None
+    if jobs not in POOLS:
+        POOLS[jobs] = multiprocessing.Pool(jobs)
+    return POOLS[jobs]
+
+
+def closePools():
+    # pools are kept for all searches of process and stopped at its exit
+    for pool in POOLS.values():
+        pool.terminate()
+    POOLS.clear()
+
+
+atexit.register(closePools)
+
+
+class MCTS(demo.BigMoney):
+    # Chooses every buy by Monte Carlo search over <max_arms> most expensive
+    # cards it can buy, treasures and buying nothing: rollouts play clones
+    # of game by <rollout_policy> for every player, better looking buys get more of <rollouts> (UCB1).
+    # Search stops after <time_limit> seconds per decision if it is set;
+    # with <jobs> > 1 every process of pool searches its share of
+    # rollouts and their results are summed. Actions are not searched.
+    rollouts = 256
+    time_limit = None
+    horizon = 40
+    margin = 0.5
+    exploration = 0.7
+    max_arms = 4
+    jobs = 1
+    rollout_policy = demo.BigMoney
+    def __init__(self, game):
+        demo.BigMoney.__init__(self, game)
+        # own random stream of search seeded by game seed and seat on first
+        # search, so searching does not change shuffles of the game
+        self.random = None
+    def action(self):
+        # cards giving more actions first, then ones drawing more cards,
+        # with their first accepted targets; throne room counts for card
+        # it doubles, so it is not left without target
+        while self.player.actions > 0:
+            moves = self.game.legalPlays()
+            if len(moves) == 0:
+                break
+            def rank(move):
+                actions, draw_cards, money = playEffects(move)
+                return actions > 0, draw_cards, money
+            self.game.doMove(max(moves, key=rank))
+    def buy(self):
+        self._playAllTreasures()
+        while self.player.buys > 0:
+            arms = [None] + self.candidates()
+            if len(arms) == 1:
+                break
+            card_type = self.search(arms)
+            if card_type is None:
+                break
+            self.player.buy(card_type)
+    def candidates(self):
+        # the most expensive cards player can buy, so rollouts are not
+        # spread over obviously poor buys, and every treasure, as money is
+        # what rollout policy lives on
+        card_types = [card_type for _, card_type, _ in self.game.legalBuys()
+                      if card_type not in (Curse, Copper)]
+        card_types.sort(key=lambda card_type:
+            (self.game.currentCost(card_type), card_type.type_id),
+            reverse=True)
+        return card_types[:self.max_arms] + [card_type
+            for card_type in card_types[self.max_arms:]
+            if card_type.hasType(Treasure)]
+    def search(self, arms):
+        # most visited arm is the best one, ties are broken by reward
+        game = self.game.clone(self.rollout_policy)
+        deadline = None
+        if self.time_limit is not None:
+            deadline = time.time() + self.time_limit
+        if self.random is None:
+            self.random = random.Random()
+            if self.game.seed is not None:
+                self.random.seed("search:{}:{}".format(self.game.seed,
+                    self.player.nplayer))
+        seed = self.random.getrandbits(32)
+        args = (game, self.player.nplayer, arms, self.rollout_policy,
+            self.rollouts, deadline, self.horizon, self.margin,
+            self.exploration)
+        pool = searchPool(self.jobs)
+        if pool is None:
+            visits, rewards = searchBuys(*(args + (seed,)))
+        else:
+            args = args[:4] + (-(-self.rollouts // self.jobs),) + args[5:]
+            visits, rewards = [0] * len(arms), [0.0] * len(arms)
+            for job_visits, job_rewards in pool.starmap(searchBuys,
+                    [args + (seed + job,) for job in range(self.jobs)]):
+                visits = [a + b for a, b in zip(visits, job_visits)]
+                rewards = [a + b for a, b in zip(rewards, job_rewards)]
+        best = max(range(len(arms)), key=lambda i:
+            (visits[i], rewards[i] / max(1, visits[i])))
+        return arms[best]
+
+
+class ParallelMCTS(MCTS):
+    rollouts = 1024
+    jobs = 4
@@ -0,0 +1,64 @@
+import random
+import unittest
+
+import core.engine
+import core.rules
+
+from strategy import demo
+
+
+SETS = ['base1e', 'base2e', 'intrigue1e', 'intrigue2e']
+
+
+class RandomMoves(demo.Basic):
+    # plays random legal moves (cards before buys, so kingdom cards are
+    # bought and played) and ends phase at random, every other legal move
+    # is tried in a clone of game; card callbacks are answered by
+    # demo.Basic
+    rng = random.Random(0)
+    moves = []
+    def play(self):
+        while True:
+            moves = self.game.legalPlays() or self.game.legalBuys()
+            for move in moves:
+                self.moves.append(move)
+                self.game.clone().doMove(move)
+                self.moves.pop()
+            if len(moves) == 0 or self.rng.random() < 0.05:
+                return
+            move = self.rng.choice(moves)
+            self.moves.append(move)
+            self.game.doMove(move)
+    def action(self):
+        self.play()
+    def buy(self):
+        self.play()
+
+
+class LegalMovesTest(unittest.TestCase):
+    def playGames(self, ngames, card_types=[]):
+        rng = random.Random(1)
+        candidates = [card_type.name()
+                      for card_type in core.engine.kingdomCandidates(SETS)
+                      if card_type.name() not in card_types]
+        for seed in range(ngames):
+            kingdom = card_types + rng.sample(candidates,
+                core.rules.SUPPLY_PILES - len(card_types))
+            game = core.engine.Game([RandomMoves] * 3, card_types=kingdom,
+                seed=seed)
+            for _ in range(150):
+                del RandomMoves.moves[:]
+                try:
+                    if game.turn():
+                        break
+                except Exception as e:
+                    self.fail("{} after moves {} in kingdom {}".format(
+                        repr(e), RandomMoves.moves, kingdom))
+    
+    def testRandomKingdoms(self):
+        self.playGames(20)
+    
+    def testThroneRoom(self):
+        # second play of throne room gets targets of cards left after the
+        # first one
+        self.playGames(20, ["throneroom"])
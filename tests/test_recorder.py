@@ -0,0 +1,54 @@
+import io
+import unittest
+
+import core.engine
+import core.recorder
+import core.replay
+
+from test_moves import RandomMoves
+
+
+class Plays(object):
+    # listener keeping (player, [card type] + targets) of every play
+    def __init__(self):
+        self.plays = []
+    def onPlay(self, player, card, targets):
+        self.plays.append((player.nplayer - 1, [card.__class__] +
+            core.engine.cardTypes(targets)))
+
+
+class RecordReplayTest(unittest.TestCase):
+    def testThroneRoom(self):
+        # throne room targets are nested lists of targets of its card
+        kingdom = ["throneroom", "remodel", "mine", "workshop", "chapel",
+                   "cellar", "village", "smithy", "militia", "courtyard"]
+        nested = 0
+        for seed in range(10):
+            game = core.engine.Game([RandomMoves] * 2, card_types=kingdom,
+                seed=seed)
+            stream = io.BytesIO()
+            recorder = core.recorder.Recorder(stream, keyframes=7)
+            recorder.attach(game)
+            plays = Plays()
+            game.listen(plays)
+            for _ in range(150):
+                if game.turn():
+                    break
+            recorder.detach(game)
+            stream.seek(0)
+            replay = core.replay.Replay(core.replay.loadGame(stream))
+            replayed = []
+            while replay.turn < replay.turns:
+                replayed += [(player, card_types)
+                    for opcode, player, card_types in replay.step()
+                    if opcode == core.recorder.OP_PLAY]
+            self.assertEqual(plays.plays, replayed)
+            for player in game.players:
+                self.assertEqual(
+                    sorted(card.type_id for card in player.hand.cards),
+                    sorted(card_type.type_id for card_type in
+                           replay.playerZone(player.nplayer - 1, "hand")))
+            nested += sum(1 for player, card_types in replayed
+                          if any(type(target) is list and len(target) > 0
+                                 for target in card_types))
+        self.assertGreater(nested, 0)
@@ -0,0 +1,122 @@
+import random
+import unittest
+
+import core.engine
+import core.rules
+import core.undo
+
+from strategy import demo
+
+from test_moves import SETS
+
+
+def snapshot(game):
+    # full state restored by rollback: cards of every zone (in order where
+    # zone is ordered), picked and empty piles counters, counters of game
+    # and players and states of random generators
+    zones = []
+    for zone in game.zones():
+        order = None
+        if isinstance(zone, core.engine.OrderedZone):
+            order = [id(card) for card in zone.cards]
+        zones.append((zone.zone_id,
+            dict((card_type, sorted(id(card) for card in pile))
+                 for card_type, pile in zone.piles.items() if len(pile) > 0),
+            order, zone.count(),
+            dict((card_type, count) for card_type, count
+                 in zone.picked.items() if count != 0),
+            zone.empty_piles, zone.empty_curse_piles))
+    players = [(player.money, player.actions, player.buys,
+                player.actions_played, player.turns_taken, list(player.owned),
+                player.owned_count, player.owned_score,
+                player.random.getstate())
+               for player in game.players]
+    return (game.active_player, game.phase, game.cost_modifier,
+            game.random.getstate(), zones, players)
+
+
+class UndoMoves(demo.Basic):
+    # plays random legal moves like test_moves.RandomMoves; now and then
+    # tries a few random moves after mark() of <journal>, sometimes with
+    # the rest of turn (with cleanup, draws and shuffles, and nested
+    # tries), and rolls them back, state of game has to be the same as
+    # before; check() is called after every move and rollback
+    rng = random.Random(0)
+    journal = None
+    moves = []
+    def randomMove(self):
+        moves = self.game.legalPlays() or self.game.legalBuys()
+        if len(moves) == 0:
+            return False
+        move = self.rng.choice(moves)
+        self.moves.append(move)
+        self.game.doMove(move)
+        self.check()
+        return True
+    def tryMoves(self):
+        marker = self.journal.mark()
+        before = snapshot(self.game)
+        ntried = len(self.moves)
+        for _ in range(self.rng.randrange(1, 6)):
+            if not self.randomMove():
+                break
+        if marker == 0 and self.rng.random() < 0.3:
+            self.moves.append("rest of turn")
+            self.game.finishTurn()
+            self.check()
+        self.journal.rollback(marker)
+        if snapshot(self.game) != before:
+            raise AssertionError("state differs after rollback of {}".format(
+                self.moves[ntried:]))
+        del self.moves[ntried:]
+        self.journal.release(marker)
+        self.check()
+    def check(self):
+        pass
+    def play(self):
+        while True:
+            if self.rng.random() < 0.3:
+                self.tryMoves()
+            if self.rng.random() < 0.05 or not self.randomMove():
+                return
+    def action(self):
+        self.play()
+    def buy(self):
+        self.play()
+
+
+class UndoTest(unittest.TestCase):
+    strategy_cls = UndoMoves
+    
+    def playGames(self, ngames, zones, crn=False):
+        rng = random.Random(1)
+        candidates = [card_type.name()
+                      for card_type in core.engine.kingdomCandidates(SETS)]
+        for seed in range(ngames):
+            kingdom = rng.sample(candidates, core.rules.SUPPLY_PILES)
+            game = core.engine.Game([self.strategy_cls] * 3,
+                card_types=kingdom, seed=seed, zones=zones, crn=crn)
+            self.attach(game)
+            for _ in range(150):
+                del self.strategy_cls.moves[:]
+                try:
+                    if game.turn():
+                        break
+                except Exception as e:
+                    self.fail("{} after moves {} in kingdom {}".format(
+                        repr(e), self.strategy_cls.moves, kingdom))
+    
+    def attach(self, game):
+        UndoMoves.journal = core.undo.UndoJournal()
+        UndoMoves.journal.attach(game)
+    
+    def testOrderedZones(self):
+        self.playGames(10, "ordered")
+    
+    def testCountedZones(self):
+        self.playGames(10, "counted")
+    
+    def testCommonRandomNumbers(self):
+        # players shuffle with their own random generators
+        self.playGames(5, "ordered", crn=True)
+        self.playGames(5, "counted", crn=True)
@@ -0,0 +1,67 @@
+import unittest
+
+import core.zobrist
+
+import test_undo
+
+
+def recomputed(game):
+    state_hash = core.zobrist.StateHash()
+    state_hash.onNewGame(game)
+    return state_hash.value()
+
+
+class HashMoves(test_undo.UndoMoves):
+    # random moves and rollbacks of test_undo.UndoMoves, incremental hash
+    # has to be the same as one computed from scratch after every of them
+    state_hash = None
+    moves = []
+    def check(self):
+        if self.state_hash.value() != recomputed(self.game):
+            raise AssertionError("hash differs from recomputed one")
+    def action(self):
+        self.check()
+        test_undo.UndoMoves.action(self)
+
+
+class StateHashTest(test_undo.UndoTest):
+    strategy_cls = HashMoves
+    
+    def attach(self, game):
+        test_undo.UndoTest.attach(self, game)
+        HashMoves.state_hash = core.zobrist.StateHash()
+        HashMoves.state_hash.attach(game)
+    
+    def testReset(self):
+        self.playGames(1, "ordered")
+        game = HashMoves.state_hash.game
+        game.reset(seed=100)
+        self.assertEqual(HashMoves.state_hash.value(), recomputed(game))
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def testCollision(self):
+        # hashes 1, 5 and 9 share slot 1 of table of 4 slots
+        table = core.zobrist.TranspositionTable(4)
+        self.assertTrue(table.put(1, "a", depth=2))
+        # shallower state of the same search does not replace deeper one
+        self.assertFalse(table.put(5, "b", depth=1))
+        self.assertEqual(table.get(1), "a")
+        self.assertIsNone(table.get(5))
+        # deeper one does
+        self.assertTrue(table.put(5, "c", depth=3))
+        self.assertIsNone(table.get(1))
+        self.assertEqual(table.get(5, depth=3), "c")
+        self.assertIsNone(table.get(5, depth=4))
+        # and so does one of the same depth
+        self.assertTrue(table.put(13, "x", depth=3))
+        self.assertIsNone(table.get(5))
+        # entries of previous search are replaced by any depth
+        table.newSearch()
+        self.assertTrue(table.put(9, "d", depth=0))
+        self.assertEqual(table.get(9), "d")
+        # the same state is always updated
+        self.assertTrue(table.put(9, "e", depth=0))
+        self.assertEqual(table.get(9), "e")
+        self.assertIsNone(table.get(13))
+        self.assertIsNone(table.get(2))